@@ -0,0 +1,220 @@
+import os
+import sys
+import math
+import json
+import struct
+import argparse
+import subprocess
+import logging
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+ANALYSIS_SAMPLE_RATE = 48000          # BS.1770 K-weighting coefficients are defined at 48kHz
+ANALYSIS_CHANNELS = 2
+PEAKS_PER_SECOND = 10                 # one waveform bar per 100ms
+SUBBLOCK_SAMPLES = ANALYSIS_SAMPLE_RATE // PEAKS_PER_SECOND
+DECODE_SECONDS = 60                   # PCM held in memory at once
+
+WAVEFORM_DIR = os.path.join('assets', 'waveforms')
+WAVEFORM_MAGIC = b'MTRW'
+WAVEFORM_VERSION = 1
+# magic, version, peaks per second, peak count, integrated LUFS, sample peak
+WAVEFORM_HEADER = struct.Struct('<4sBxHIff')
+
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+
+# K-weighting: high-shelf pre-filter followed by the RLB high-pass (ITU-R BS.1770-4)
+K_WEIGHTING_STAGES = [
+    ([1.53512485958697, -2.69169618940638, 1.19839281085285],
+     [1.0, -1.69065929318241, 0.73248077421585]),
+    ([1.0, -2.0, 1.0],
+     [1.0, -1.99004745483398, 0.99007225036621]),
+]
+
+# ============================================================================
+# ANALYSIS
+# ============================================================================
+
+def k_weighting_power_response(n_fft, sample_rate=ANALYSIS_SAMPLE_RATE):
+    """|H(f)|^2 of the K-weighting filter at each rfft bin"""
+    freqs = np.fft.rfftfreq(n_fft, d=1 / sample_rate)
+    z_inv = np.exp(-2j * np.pi * freqs / sample_rate)
+    response = np.ones_like(z_inv)
+    for b, a in K_WEIGHTING_STAGES:
+        response *= (b[0] + b[1] * z_inv + b[2] * z_inv ** 2) / (a[0] + a[1] * z_inv + a[2] * z_inv ** 2)
+    return np.abs(response) ** 2
+
+
+def decode_pcm(filepath, seconds=DECODE_SECONDS):
+    """Yield float32 PCM from ffmpeg as (samples, channels) arrays of whole sub-blocks"""
+    cmd = [
+        'ffmpeg', '-v', 'quiet',
+        '-i', filepath,
+        '-f', 'f32le',
+        '-ac', str(ANALYSIS_CHANNELS),
+        '-ar', str(ANALYSIS_SAMPLE_RATE),
+        '-'
+    ]
+    frame_bytes = 4 * ANALYSIS_CHANNELS
+    read_size = seconds * ANALYSIS_SAMPLE_RATE * frame_bytes
+
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        leftover = b''
+        while True:
+            data = process.stdout.read(read_size)
+            if not data:
+                break
+            data = leftover + data
+            usable = len(data) - len(data) % (SUBBLOCK_SAMPLES * frame_bytes)
+            leftover = data[usable:]
+            if usable:
+                yield np.frombuffer(data[:usable], dtype='<f4').reshape(-1, ANALYSIS_CHANNELS)
+
+        # Zero-pad the final partial sub-block so no audio is dropped
+        if leftover:
+            pad = SUBBLOCK_SAMPLES * frame_bytes - len(leftover)
+            yield np.frombuffer(leftover + b'\x00' * pad, dtype='<f4').reshape(-1, ANALYSIS_CHANNELS)
+    finally:
+        process.stdout.close()
+        process.wait()
+
+
+def integrated_loudness(subblock_power):
+    """Gated integrated loudness (LUFS) from per-100ms K-weighted mean square power.
+
+    subblock_power has shape (subblocks, channels). 400ms gating blocks with
+    75% overlap are the mean of four consecutive sub-blocks.
+    """
+    if len(subblock_power) < 4:
+        return float('-inf')
+
+    cumulative = np.cumsum(np.vstack([np.zeros((1, subblock_power.shape[1])), subblock_power]), axis=0)
+    block_power = ((cumulative[4:] - cumulative[:-4]) / 4).sum(axis=1)
+
+    with np.errstate(divide='ignore'):
+        block_loudness = -0.691 + 10 * np.log10(block_power)
+
+    gated = block_power[block_loudness > ABSOLUTE_GATE_LUFS]
+    if not len(gated):
+        return float('-inf')
+
+    relative_gate = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE_LU
+    gated = block_power[(block_loudness > ABSOLUTE_GATE_LUFS) & (block_loudness > relative_gate)]
+    if not len(gated):
+        return float('-inf')
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def analyze_pcm(chunks):
+    """Compute waveform peaks, integrated loudness and sample peak from PCM chunks"""
+    power_response = k_weighting_power_response(SUBBLOCK_SAMPLES)
+    # Parseval weights for a one-sided spectrum: DC and Nyquist bins count once
+    bin_weights = np.full(len(power_response), 2.0)
+    bin_weights[0] = 1.0
+    bin_weights[-1] = 1.0
+    power_response = power_response * bin_weights / SUBBLOCK_SAMPLES ** 2
+
+    peaks = []
+    powers = []
+    for pcm in chunks:
+        subblocks = pcm.reshape(-1, SUBBLOCK_SAMPLES, ANALYSIS_CHANNELS)
+        peaks.append(np.abs(subblocks).max(axis=(1, 2)))
+        spectrum = np.fft.rfft(subblocks, axis=1)
+        powers.append(np.einsum('bfc,f->bc', np.abs(spectrum) ** 2, power_response))
+
+    if not peaks:
+        return np.zeros(0, dtype=np.float32), float('-inf'), 0.0
+
+    peaks = np.concatenate(peaks)
+    return peaks, integrated_loudness(np.concatenate(powers)), float(peaks.max())
+
+
+def write_waveform(path, peaks, loudness, sample_peak):
+    """Write the compact binary sidecar: header followed by uint8 peak magnitudes"""
+    scaled = np.clip(np.round(peaks * 255), 0, 255).astype(np.uint8)
+    header = WAVEFORM_HEADER.pack(WAVEFORM_MAGIC, WAVEFORM_VERSION, PEAKS_PER_SECOND,
+                                  len(scaled), loudness, sample_peak)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(header)
+        f.write(scaled.tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_waveform(path):
+    """Read a sidecar back into (peaks, loudness, sample_peak)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, peaks_per_second, count, loudness, sample_peak = WAVEFORM_HEADER.unpack_from(data)
+    if magic != WAVEFORM_MAGIC or version != WAVEFORM_VERSION:
+        raise ValueError(f'Not a waveform sidecar: {path}')
+    peaks = np.frombuffer(data, dtype=np.uint8, count=count, offset=WAVEFORM_HEADER.size)
+    return peaks.astype(np.float32) / 255, loudness, sample_peak
+
+
+def waveform_path(archive_id):
+    return os.path.join(WAVEFORM_DIR, f'{archive_id}.peaks')
+
+
+def analyze_archive(mp3_path, archive_id):
+    """Analyze one archive, write its sidecar and return (loudness, sample_peak).
+
+    Loudness is None for archives that are silent throughout.
+    """
+    peaks, loudness, sample_peak = analyze_pcm(decode_pcm(mp3_path))
+    os.makedirs(WAVEFORM_DIR, exist_ok=True)
+    write_waveform(waveform_path(archive_id), peaks, loudness, sample_peak)
+    logger.info(f"Analyzed {archive_id}: {loudness:.1f} LUFS, peak {sample_peak:.3f}, {len(peaks)} bars")
+    return (loudness if math.isfinite(loudness) else None), sample_peak
+
+# ============================================================================
+# BACKFILL
+# ============================================================================
+
+def backfill(archive_path, data_dir='data', force=False):
+    """Analyze every catalog entry that has no loudness data or sidecar yet"""
+    for archive_file in sorted(os.listdir(data_dir)):
+        if not archive_file.endswith('.json'):
+            continue
+
+        record_path = os.path.join(data_dir, archive_file)
+        with open(record_path, 'r') as f:
+            data = json.load(f)
+
+        archive_id = data['id']
+        if not force and 'loudness' in data and os.path.exists(waveform_path(archive_id)):
+            continue
+
+        mp3_path = os.path.join(archive_path, data['filename'])
+        if not os.path.exists(mp3_path):
+            logger.warning(f"Skipping {archive_id}: {mp3_path} not found")
+            continue
+
+        try:
+            data['loudness'], data['peak'] = analyze_archive(mp3_path, archive_id)
+        except Exception as e:
+            logger.error(f"Error analyzing {archive_id}: {e}")
+            continue
+
+        with open(record_path, 'w') as f:
+            json.dump(data, f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute waveform and loudness sidecars')
+    parser.add_argument('--archive-path', default='/var/lib/mtr/archives')
+    parser.add_argument('--force', action='store_true', help='re-analyze archives that already have data')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.archive_path):
+        logger.error(f"Archive path {args.archive_path} does not exist")
+        sys.exit(1)
+    backfill(args.archive_path, force=args.force)
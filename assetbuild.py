@@ -0,0 +1,233 @@
+import os
+import sys
+import gzip
+import json
+import hashlib
+import argparse
+import logging
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # gzip-only precompression
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None  # images are copied at their original size only
+
+try:
+    from fontTools.ttLib import TTFont
+except ImportError:
+    TTFont = None  # fonts are served as TrueType only
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+SOURCE_DIR = 'assets'
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+
+COMPRESSIBLE = {'.css', '.js', '.json', '.svg', '.ico', '.ttf', '.otf', '.webmanifest', '.txt'}
+MIN_COMPRESSION_RATIO = 0.9     # keep an encoded copy only if it saves at least 10%
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}  # in order of preference
+
+RASTER_IMAGES = {'.png', '.jpg', '.jpeg', '.webp'}
+IMAGE_WIDTHS = (160, 320, 640, 960, 1280)
+WEBP_QUALITY = 80
+
+# ============================================================================
+# MANIFEST
+# ============================================================================
+# dist/manifest.json maps each path under assets/ to its build output:
+#
+#   "residents/Cuts.png": {
+#       "file": "residents/Cuts.<hash>.png",
+#       "encodings": [],                       # ["br", "gzip"] -> file.br, file.gz
+#       "width": 1055,
+#       "variants": [[160, "residents/Cuts.<hash>.160w.webp"], ...]
+#   }
+#
+# TrueType fonts get an extra "<name>.woff2" entry. Output names change
+# whenever the content does, so everything in dist/ can be cached forever.
+
+def load_manifest(dist_dir=DIST_DIR):
+    """{asset path: entry} from the last build, or {} when nothing was built"""
+    try:
+        with open(os.path.join(dist_dir, MANIFEST_NAME), 'r') as f:
+            return json.load(f)['assets']
+    except (OSError, ValueError, KeyError):
+        return {}
+
+# ============================================================================
+# BUILD
+# ============================================================================
+
+def content_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(1024 * 1024):
+            digest.update(block)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def write_atomic(path, data):
+    """Write through a temp name so a running server never serves a partial file"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+
+def precompress(path, data):
+    """Write .br/.gz siblings that are worth serving; returns their encodings, best first"""
+    encoders = {'gzip': lambda: gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli:
+        encoders['br'] = lambda: brotli.compress(data, quality=11)
+
+    encodings = []
+    for encoding, suffix in ENCODING_SUFFIXES.items():
+        if encoding not in encoders:
+            continue
+        if not os.path.exists(path + suffix):
+            encoded = encoders[encoding]()
+            if len(encoded) > len(data) * MIN_COMPRESSION_RATIO:
+                continue
+            write_atomic(path + suffix, encoded)
+        encodings.append(encoding)
+    return encodings
+
+
+def make_woff2(source, target):
+    if not os.path.exists(target):
+        font = TTFont(source)
+        font.flavor = 'woff2'
+        font.save(target + '.tmp')
+        os.replace(target + '.tmp', target)
+
+
+def make_variants(source, dist_dir, output_stem):
+    """Resize a raster image to each IMAGE_WIDTHS step below its own width, as WebP.
+
+    Returns (original_width, [[width, name], ...]) with names relative to dist_dir.
+    """
+    variants = []
+    with Image.open(source) as image:
+        if getattr(image, 'is_animated', False):
+            return image.width, variants
+
+        for width in IMAGE_WIDTHS:
+            if width >= image.width:
+                break
+            name = f'{output_stem}.{width}w.webp'
+            target = os.path.join(dist_dir, name)
+            if not os.path.exists(target):
+                height = max(round(image.height * width / image.width), 1)
+                resized = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+                resized = resized.resize((width, height), Image.LANCZOS)
+                resized.save(target + '.tmp', 'WEBP', quality=WEBP_QUALITY, method=6)
+                os.replace(target + '.tmp', target)
+            variants.append([width, name])
+        return image.width, variants
+
+
+def build_asset(source_dir, dist_dir, logical):
+    """Fingerprint one asset and its derived files; returns the manifest entries it produced"""
+    source = os.path.join(source_dir, logical)
+    stem, ext = os.path.splitext(logical)
+    ext = ext.lower()
+    output_stem = f'{stem}.{content_hash(source)}'
+
+    name = output_stem + ext
+    target = os.path.join(dist_dir, name)
+    with open(source, 'rb') as f:
+        data = f.read()
+    if not os.path.exists(target):
+        write_atomic(target, data)
+
+    entry = {'file': name, 'encodings': []}
+    entries = {logical: entry}
+    if ext in COMPRESSIBLE:
+        entry['encodings'] = precompress(target, data)
+
+    if ext == '.ttf' and TTFont and brotli:
+        woff2_name = output_stem + '.woff2'
+        make_woff2(source, os.path.join(dist_dir, woff2_name))
+        entries[stem + '.woff2'] = {'file': woff2_name, 'encodings': []}
+
+    if ext in RASTER_IMAGES and Image:
+        entry['width'], entry['variants'] = make_variants(source, dist_dir, output_stem)
+
+    return entries
+
+
+def referenced_files(manifest):
+    files = {MANIFEST_NAME}
+    for entry in manifest.values():
+        files.add(entry['file'])
+        files.update(entry['file'] + ENCODING_SUFFIXES[encoding] for encoding in entry['encodings'])
+        files.update(name for _, name in entry.get('variants', []))
+    return files
+
+
+def prune(dist_dir, manifest):
+    """Delete build output the new manifest no longer references"""
+    keep = referenced_files(manifest)
+    removed = 0
+    for root, _, filenames in os.walk(dist_dir):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            if os.path.relpath(path, dist_dir) not in keep:
+                os.remove(path)
+                removed += 1
+    return removed
+
+
+def build(source_dir=SOURCE_DIR, dist_dir=DIST_DIR, prune_old=False):
+    """Build every asset into dist_dir and write the manifest last, once all files exist"""
+    logical_paths = []
+    for root, _, filenames in os.walk(source_dir):
+        for filename in filenames:
+            if not filename.startswith('.'):
+                logical_paths.append(os.path.relpath(os.path.join(root, filename), source_dir))
+
+    manifest = {}
+    for logical in sorted(logical_paths):
+        try:
+            manifest.update(build_asset(source_dir, dist_dir, logical))
+        except Exception as e:
+            logger.error(f"Failed to build {logical}: {e}")
+
+    document = json.dumps({'assets': manifest}, indent=1, sort_keys=True)
+    write_atomic(os.path.join(dist_dir, MANIFEST_NAME), document.encode())
+
+    encoded = sum(1 for entry in manifest.values() if entry['encodings'])
+    variants = sum(len(entry.get('variants', [])) for entry in manifest.values())
+    logger.info(f"Built {len(manifest)} assets into {dist_dir}: {encoded} precompressed, {variants} image variants")
+    if not brotli:
+        logger.warning("brotli not installed: gzip only, no WOFF2 fonts")
+    if not Image:
+        logger.warning("Pillow not installed: no resized image variants")
+
+    if prune_old:
+        logger.info(f"Pruned {prune(dist_dir, manifest)} stale files")
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fingerprint, precompress and resize static assets')
+    parser.add_argument('--source', default=SOURCE_DIR)
+    parser.add_argument('--dist', default=DIST_DIR)
+    parser.add_argument('--prune', action='store_true',
+                        help='delete outputs of earlier builds (breaks pages still served by old workers)')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.source):
+        logger.error(f"Source directory {args.source} does not exist")
+        sys.exit(1)
+    build(args.source, args.dist, args.prune)
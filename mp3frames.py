@@ -0,0 +1,240 @@
+import struct
+
+# ============================================================================
+# MPEG AUDIO LAYER III FRAME PARSING
+# ============================================================================
+
+MPEG1 = 3
+MPEG2 = 2
+MPEG25 = 0
+
+BITRATES = {
+    MPEG1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    MPEG2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+BITRATES[MPEG25] = BITRATES[MPEG2]
+
+SAMPLE_RATES = {
+    MPEG1: [44100, 48000, 32000],
+    MPEG2: [22050, 24000, 16000],
+    MPEG25: [11025, 12000, 8000],
+}
+
+GAIN_STEP_DB = 1.5  # one global_gain step is 2^(1/4) in amplitude
+
+
+class FrameHeader:
+    """Decoded 4-byte Layer III frame header"""
+
+    def __init__(self, version, protected, bitrate, sample_rate, padding, channels):
+        self.version = version
+        self.protected = protected
+        self.bitrate = bitrate
+        self.sample_rate = sample_rate
+        self.padding = padding
+        self.channels = channels
+
+    @property
+    def samples(self):
+        return 1152 if self.version == MPEG1 else 576
+
+    @property
+    def length(self):
+        """Frame length in bytes, header included"""
+        coefficient = 144 if self.version == MPEG1 else 72
+        return coefficient * self.bitrate * 1000 // self.sample_rate + self.padding
+
+    @property
+    def duration(self):
+        return self.samples / self.sample_rate
+
+    @property
+    def side_info_size(self):
+        if self.version == MPEG1:
+            return 17 if self.channels == 1 else 32
+        return 9 if self.channels == 1 else 17
+
+
+def parse_frame_header(data, offset=0):
+    """Parse the Layer III header at data[offset:offset + 4], or None if it isn't one"""
+    if offset + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[offset:offset + 4]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+
+    version = (b1 >> 3) & 3
+    layer = (b1 >> 1) & 3
+    bitrate_index = b2 >> 4
+    sample_rate_index = (b2 >> 2) & 3
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None  # reserved values, free format or not Layer III
+
+    return FrameHeader(
+        version=version,
+        protected=not (b1 & 1),
+        bitrate=BITRATES[version][bitrate_index],
+        sample_rate=SAMPLE_RATES[version][sample_rate_index],
+        padding=(b2 >> 1) & 1,
+        channels=1 if (b3 >> 6) == 3 else 2,
+    )
+
+
+def id3v2_size(data):
+    """Length of a leading ID3v2 tag (0 if there is none)"""
+    if len(data) < 10 or data[:3] != b'ID3':
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)  # syncsafe integer
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def find_frame(data, offset=0, final=True):
+    """Return (offset, header) of the next frame whose successor also syncs.
+
+    With final=False `data` is a partial buffer: a candidate whose successor
+    is not buffered yet comes back as (offset, None) so the caller can read
+    more before deciding.
+    """
+    while True:
+        offset = data.find(b'\xff', offset)
+        if offset < 0:
+            return None, None
+        header = parse_frame_header(data, offset)
+        if header:
+            following = offset + header.length
+            if not final and following + 4 > len(data):
+                return offset, None
+            if following >= len(data) or parse_frame_header(data, following):
+                return offset, header
+        offset += 1
+
+
+def iter_frames(data):
+    """Yield (offset, header) for each Layer III frame, resyncing past junk"""
+    offset, header = find_frame(data, id3v2_size(data))
+    while header:
+        yield offset, header
+        offset += header.length
+        header = parse_frame_header(data, offset)
+        if not header:
+            offset, header = find_frame(data, offset)
+
+
+def read_frames(stream, block_size=16384):
+    """Yield (frame_bytes, header) from a file or pipe, resyncing past junk.
+
+    Starts at whatever position the stream is at, so callers can seek to
+    an approximate byte offset and get whole frames from there on. Like
+    iter_frames(), a frame directly following the previous one is trusted;
+    only (re)syncing requires the next frame to sync as well.
+    """
+    read = getattr(stream, 'read1', stream.read)
+    buffer = bytearray()
+    eof = False
+    synced = False
+    while True:
+        while not eof and len(buffer) < block_size:
+            block = read(block_size)
+            if not block:
+                eof = True
+            buffer += block
+
+        offset = 0
+        header = parse_frame_header(buffer) if synced else None
+        if header is None:
+            offset, header = find_frame(buffer, final=eof)
+            if offset is not None:
+                del buffer[:offset]  # junk before the (candidate) sync point
+        synced = header is not None
+        if header is None or header.length > len(buffer):
+            if eof:
+                return
+            if offset is None:
+                del buffer[:max(len(buffer) - 3, 0)]  # keep a possibly split header
+            block = read(block_size)
+            if not block:
+                eof = True
+            buffer += block
+            continue
+
+        yield bytes(buffer[:header.length]), header
+        del buffer[:header.length]
+
+# ============================================================================
+# GLOBAL GAIN EDITING
+# ============================================================================
+
+def _get_bits(data, bit_offset, count):
+    value = 0
+    for i in range(bit_offset, bit_offset + count):
+        value = (value << 1) | ((data[i >> 3] >> (7 - (i & 7))) & 1)
+    return value
+
+
+def _set_bits(data, bit_offset, count, value):
+    for i in range(bit_offset + count - 1, bit_offset - 1, -1):
+        mask = 1 << (7 - (i & 7))
+        if value & 1:
+            data[i >> 3] |= mask
+        else:
+            data[i >> 3] &= ~mask & 0xFF
+        value >>= 1
+
+
+def global_gain_offsets(header):
+    """Bit offsets of every global_gain field, relative to the start of side info"""
+    if header.version == MPEG1:
+        granules, granule_bits = 2, 59
+        start = 9 + (5 if header.channels == 1 else 3) + 4 * header.channels
+    else:
+        granules, granule_bits = 1, 63
+        start = 8 + (1 if header.channels == 1 else 2)
+
+    # part2_3_length (12) and big_values (9) precede global_gain
+    return [
+        start + (granule * header.channels + channel) * granule_bits + 21
+        for granule in range(granules)
+        for channel in range(header.channels)
+    ]
+
+
+def crc16(data, crc=0xFFFF):
+    """CRC-16 (poly 0x8005) as used for protected MPEG audio frames"""
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x8005) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+    return crc
+
+
+def apply_gain_steps(data, steps):
+    """Shift every global_gain field in an MP3 buffer by `steps` (1.5 dB each), in place.
+
+    Frame sizes and byte offsets are untouched, so the edited file can be
+    served with the same byterate and seek arithmetic as the original.
+    Returns the number of frames edited.
+    """
+    frames = 0
+    if not steps:
+        return frames
+
+    for offset, header in iter_frames(data):
+        side_info = offset + 4 + (2 if header.protected else 0)
+        if side_info + header.side_info_size > len(data):
+            break
+
+        base = side_info * 8
+        for gain_offset in global_gain_offsets(header):
+            gain = _get_bits(data, base + gain_offset, 8)
+            _set_bits(data, base + gain_offset, 8, min(max(gain + steps, 0), 255))
+
+        if header.protected:
+            crc = crc16(data[offset + 2:offset + 4])
+            crc = crc16(data[side_info:side_info + header.side_info_size], crc)
+            struct.pack_into('>H', data, offset + 4, crc)
+        frames += 1
+    return frames
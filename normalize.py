@@ -0,0 +1,104 @@
+import os
+import sys
+import json
+import math
+import argparse
+import logging
+import mp3frames
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+TARGET_LOUDNESS = -16.0     # LUFS
+MAX_SAMPLE_PEAK = 0.98      # never boost a track past this level
+NORMALIZED_DIR = 'normalized'
+
+# ============================================================================
+# NORMALIZATION
+# ============================================================================
+
+def normalized_path(archive_path, filename):
+    """Where the gain-adjusted copy of an archive lives, next to the original"""
+    return os.path.join(archive_path, NORMALIZED_DIR, filename)
+
+
+def gain_steps_for(loudness, peak, target=TARGET_LOUDNESS):
+    """Whole global_gain steps that bring `loudness` to `target` without clipping"""
+    if loudness is None:
+        return 0
+
+    steps = round((target - loudness) / mp3frames.GAIN_STEP_DB)
+    if peak and steps > 0:
+        headroom_db = 20 * math.log10(MAX_SAMPLE_PEAK / peak)
+        steps = min(steps, max(math.floor(headroom_db / mp3frames.GAIN_STEP_DB), 0))
+    return steps
+
+
+def normalize_archive(mp3_path, output_path, loudness, peak):
+    """Write a loudness-normalized copy of an MP3 and return the applied gain in dB.
+
+    The copy is made by editing each frame's global_gain field, so it has
+    exactly the same size and frame layout as the original and streaming
+    stays a plain byte copy.
+    """
+    steps = gain_steps_for(loudness, peak)
+
+    with open(mp3_path, 'rb') as f:
+        data = bytearray(f.read())
+    frames = mp3frames.apply_gain_steps(data, steps)
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, output_path)
+
+    gain = steps * mp3frames.GAIN_STEP_DB
+    logger.info(f"Normalized {os.path.basename(mp3_path)}: {gain:+.1f} dB over {frames} frames")
+    return gain
+
+# ============================================================================
+# BACKFILL
+# ============================================================================
+
+def backfill(archive_path, data_dir='data', force=False):
+    """Create normalized copies for every analyzed catalog entry that lacks one"""
+    for archive_file in sorted(os.listdir(data_dir)):
+        if not archive_file.endswith('.json'):
+            continue
+
+        record_path = os.path.join(data_dir, archive_file)
+        with open(record_path, 'r') as f:
+            data = json.load(f)
+
+        if 'loudness' not in data:
+            logger.warning(f"Skipping {data['id']}: no loudness data, run analysis.py first")
+            continue
+
+        mp3_path = os.path.join(archive_path, data['filename'])
+        output_path = normalized_path(archive_path, data['filename'])
+        if os.path.exists(output_path) and not force:
+            continue
+        if not os.path.exists(mp3_path):
+            logger.warning(f"Skipping {data['id']}: {mp3_path} not found")
+            continue
+
+        data['gain'] = normalize_archive(mp3_path, output_path, data['loudness'], data.get('peak'))
+        with open(record_path, 'w') as f:
+            json.dump(data, f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create loudness-normalized copies of archives')
+    parser.add_argument('--archive-path', default='/var/lib/mtr/archives')
+    parser.add_argument('--force', action='store_true', help='rewrite existing normalized copies')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.archive_path):
+        logger.error(f"Archive path {args.archive_path} does not exist")
+        sys.exit(1)
+    backfill(args.archive_path, force=args.force)
@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+import threading
+import traceback
+import collections
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+PROFILING_ENABLED = os.environ.get('MTR_PROFILING') == '1'
+DEFAULT_INTERVAL = 0.005     # seconds between samples
+MAX_SECONDS = 60
+
+# ============================================================================
+# LOCK CONTENTION
+# ============================================================================
+
+contended_locks = []
+
+class ContendedLock:
+    """threading.Lock that records how often and how long acquirers had to wait"""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self._lock.acquire(False):
+            self.acquisitions += 1
+            return True
+        if not blocking:
+            return False
+
+        start = time.perf_counter()
+        if not self._lock.acquire(True, timeout):
+            return False
+        # Stats are only touched while holding the lock, so no extra locking needed
+        wait = time.perf_counter() - start
+        self.acquisitions += 1
+        self.contended += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        return True
+
+    def release(self):
+        self._lock.release()
+
+    def locked(self):
+        return self._lock.locked()
+
+    __enter__ = acquire
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def report(self):
+        return {
+            'name': self.name,
+            'acquisitions': self.acquisitions,
+            'contended': self.contended,
+            'contended_ratio': self.contended / self.acquisitions if self.acquisitions else 0,
+            'total_wait_ms': round(self.total_wait * 1000, 3),
+            'max_wait_ms': round(self.max_wait * 1000, 3)
+        }
+
+
+def make_lock(name):
+    """A plain Lock, or an instrumented one when profiling is enabled"""
+    if not PROFILING_ENABLED:
+        return threading.Lock()
+    lock = ContendedLock(name)
+    contended_locks.append(lock)
+    return lock
+
+
+def lock_report():
+    return [lock.report() for lock in contended_locks]
+
+# ============================================================================
+# SAMPLING PROFILER
+# ============================================================================
+
+profile_lock = threading.Lock()  # one profiling session at a time
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def sample_stacks(seconds, interval=DEFAULT_INTERVAL):
+    """Sample every thread's stack for `seconds`; returns {collapsed_stack: count}"""
+    names = {}
+    counts = collections.Counter()
+    own_id = threading.get_ident()
+    deadline = time.monotonic() + min(seconds, MAX_SECONDS)
+
+    while time.monotonic() < deadline:
+        if len(names) != threading.active_count():
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            counts[';'.join(reversed(stack))] += 1
+
+        time.sleep(interval)
+    return counts
+
+
+def collapsed(counts):
+    """Brendan Gregg's folded format, ready for flamegraph.pl or speedscope"""
+    return ''.join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+def dump_stacks():
+    """Current stack of every thread as plain text"""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    sections = []
+    for thread_id, frame in sys._current_frames().items():
+        sections.append(f"Thread {names.get(thread_id, '?')} ({thread_id}):\n"
+                        + ''.join(traceback.format_stack(frame)))
+    return '\n'.join(sections)
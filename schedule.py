@@ -0,0 +1,120 @@
+import os
+import json
+import random
+import hashlib
+from datetime import datetime, timedelta
+
+# ============================================================================
+# DETERMINISTIC BROADCAST SCHEDULE
+# ============================================================================
+# Shared by the live server (stream.py) and the offline tools (upload.py) so
+# that exported program guides always agree with what is actually streamed.
+
+BEGINNING_TIME = datetime(year=2025, month=3, day=20, hour=6)
+
+
+def catalog_order(archive_dict):
+    """Canonical (archives, total_duration) inputs for a catalog"""
+    archives = sorted(archive_dict.keys())
+    total_duration = sum(v['duration'] for v in archive_dict.values())
+    return archives, total_duration
+
+
+def read_record(path):
+    """Read one data/*.json record with the display fields every consumer shows"""
+    with open(path, 'r') as f:
+        data = json.load(f)
+    data['genre_string'] = ', '.join(data['genres'])
+    if data['show'] == 'c' and "-2" in data['title']:
+        data['title'] = ' - '.join(data['title'].split(' - ')[:-1])
+    return data
+
+
+def load_catalog(data_dir='data'):
+    """Read the data/*.json catalog the live server schedules from"""
+    archive_dict = {}
+    for archive_file in os.listdir(data_dir):
+        if archive_file.endswith('.json'):
+            data = read_record(os.path.join(data_dir, archive_file))
+            archive_dict[data['id']] = data
+    return archive_dict
+
+
+def iteration_order(archives, iteration):
+    """Shuffled play order for one full pass through the catalog"""
+    shuffled = archives.copy()
+    random.Random(iteration).shuffle(shuffled)
+
+    # Avoid back-to-back repeats across iterations
+    if iteration > 0:
+        prev_shuffled = archives.copy()
+        random.Random(iteration - 1).shuffle(prev_shuffled)
+
+        attempt = 0
+        while shuffled[0] == prev_shuffled[-1] and attempt < 100:
+            random.Random(iteration * 1000 + attempt).shuffle(shuffled)
+            attempt += 1
+
+    return shuffled
+
+
+def locate(archives, archive_dict, total_duration, when, beginning=BEGINNING_TIME):
+    """Find what plays at `when`.
+
+    Returns (iteration, order, index, track_start_seconds, elapsed) where
+    track_start_seconds counts from `beginning`, or None for an empty catalog.
+    """
+    if not archives or total_duration <= 0:
+        return None
+
+    elapsed_seconds = (when - beginning).total_seconds()
+    iteration = int(elapsed_seconds // total_duration)
+    time_into_iteration = elapsed_seconds % total_duration
+
+    order = iteration_order(archives, iteration)
+    time_sum = 0
+    for index, archive_id in enumerate(order):
+        duration = archive_dict[archive_id]['duration']
+        if time_sum + duration > time_into_iteration:
+            track_start = iteration * total_duration + time_sum
+            return iteration, order, index, track_start, time_into_iteration - time_sum
+        time_sum += duration
+
+    return None
+
+
+def iter_schedule(archives, archive_dict, total_duration, start, end=None, beginning=BEGINNING_TIME):
+    """Lazily yield (track_start, track_end, archive_id) from the track playing at `start`.
+
+    Runs until `end` (exclusive) or forever when `end` is None. Only one
+    iteration's order is held at a time, so any window costs constant memory.
+    """
+    located = locate(archives, archive_dict, total_duration, start, beginning)
+    if not located:
+        return
+    iteration, order, index, offset, _ = located
+
+    while True:
+        for archive_id in order[index:]:
+            track_start = beginning + timedelta(seconds=offset)
+            if end is not None and track_start >= end:
+                return
+            offset += archive_dict[archive_id]['duration']
+            yield track_start, beginning + timedelta(seconds=offset), archive_id
+
+        iteration += 1
+        order = iteration_order(archives, iteration)
+        index = 0
+        # Re-anchor on the iteration boundary exactly as locate() computes it
+        offset = iteration * total_duration
+
+
+def catalog_version(archives, archive_dict):
+    """Short fingerprint of everything the schedule and guide documents depend on"""
+    digest = hashlib.sha1()
+    for archive_id in archives:
+        archive = archive_dict[archive_id]
+        genres = ','.join(archive['genres'])
+        digest.update(f"{archive_id}:{archive['duration']!r}:{archive['title']}:{archive['show']}:{genres};".encode())
+    digest.update(BEGINNING_TIME.isoformat().encode())
+    return digest.hexdigest()[:12]
@@ -8,12 +8,32 @@ import requests
 import subprocess
 import threading
 import queue
+import fcntl
+import socket
 import logging
+import bisect
+import heapq
+import itertools
+import functools
+import mimetypes
 import collections 
-from datetime import datetime
-from flask import Flask, request, Response, redirect, render_template, session as flask_session
+from datetime import datetime, timedelta
+from flask import Flask, request, Response, redirect, render_template, send_from_directory, session as flask_session
 from flask_cors import CORS
+from werkzeug.http import http_date
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import wrap_file
+from markupsafe import Markup
+import normalize
+import mp3frames
+import profiling
+import schedule
+import assetbuild
+
+try:
+    import analysis
+except ImportError:
+    analysis = None  # numpy missing: uploads skip waveform/loudness analysis
 
 # ============================================================================
 # CONFIGURATION & SETUP
@@ -36,7 +56,33 @@ except:
 ALLOWED_EXTENSIONS = {'mp3', 'png', 'jpg', 'jpeg', 'gif', 'webp'}
 LIVE_STREAM_URL = "http://monotonicradio.com:8000/stream.m3u"
 LIVE_STATUS_URL = "http://monotonicradio.com:8000/status-json.xsl"
-BEGINNING_TIME = datetime(year=2025, month=3, day=20, hour=6)
+BEGINNING_TIME = schedule.BEGINNING_TIME
+
+# Scale-out: several worker processes on one host share a single producer
+SCALE_OUT = os.environ.get('MTR_SCALE_OUT') == '1'
+RELAY_SOCKET_PATH = os.environ.get('MTR_RELAY_SOCKET', '/tmp/mtr-relay.sock')
+PRODUCER_LOCK_PATH = os.environ.get('MTR_PRODUCER_LOCK', '/tmp/mtr-producer.lock')
+LIVE_STATUS_PATH = os.environ.get('MTR_LIVE_STATUS', '/tmp/mtr-live.json')
+CATALOG_POLL_SECONDS = 2
+
+# Program guide: windows are hour-aligned so every client shares cache entries
+SCHEDULE_DEFAULT_HOURS = 24
+SCHEDULE_MAX_HOURS = 7 * 24
+
+# Archive listing: the homepage renders one page, the rest comes from /episodes
+EPISODES_PER_PAGE = 9
+
+# Archive disk cache: 0 keeps every catalog MP3 on disk (downloaded at startup)
+ARCHIVE_CACHE_BYTES = int(os.environ.get('MTR_ARCHIVE_CACHE_BYTES', 0))
+PREFETCH_HOURS = float(os.environ.get('MTR_PREFETCH_HOURS', 6))
+PREFETCH_INTERVAL_SECONDS = 60
+
+# Static assets: fingerprinted output of assetbuild.py, cached for a year
+ASSET_DIST_DIR = os.environ.get('MTR_ASSET_DIR', assetbuild.DIST_DIR)
+ASSET_URL_PREFIX = '/dist/'
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+mimetypes.add_type('font/woff2', '.woff2')
+mimetypes.add_type('application/manifest+json', '.webmanifest')
 
 try: 
     with open('config.json', 'r') as f:
@@ -47,6 +93,67 @@ except:
         'AWS_P':os.environ['AWS_P']
     }
 
+# ============================================================================
+# STATIC ASSETS
+# ============================================================================
+# Templates go through asset_url() so that, once assetbuild.py has run, every
+# asset URL is content-hashed and browsers never revalidate it. Without a
+# build (or for thumbnails uploaded since) the plain /assets/ path is used.
+
+asset_manifest = assetbuild.load_manifest(ASSET_DIST_DIR)
+asset_encodings = {entry['file']: entry['encodings'] for entry in asset_manifest.values()}
+if asset_manifest:
+    logger.info(f"Loaded {len(asset_manifest)} fingerprinted assets from {ASSET_DIST_DIR}")
+
+
+def _asset_key(path):
+    """Manifest key for 'assets/x', '/assets/x' or 'x'"""
+    path = path.lstrip('/')
+    return path[len('assets/'):] if path.startswith('assets/') else path
+
+
+@app.template_global()
+def asset_url(path, width=None):
+    """URL for an asset; `width` (in device pixels) picks the smallest variant that covers it"""
+    if path.startswith(('http://', 'https://')):
+        return path
+    key = _asset_key(path)
+    entry = asset_manifest.get(key)
+    if not entry:
+        return '/assets/' + key
+
+    if width:
+        for variant_width, name in entry.get('variants', []):
+            if variant_width >= width:
+                return ASSET_URL_PREFIX + name
+    return ASSET_URL_PREFIX + entry['file']
+
+
+@app.template_global()
+def asset_srcset(path):
+    """srcset over every built width of an image, or '' if it has no variants"""
+    entry = asset_manifest.get(_asset_key(path))
+    if not entry or not entry.get('variants'):
+        return ''
+    candidates = [f"{ASSET_URL_PREFIX}{name} {width}w" for width, name in entry['variants']]
+    candidates.append(f"{ASSET_URL_PREFIX}{entry['file']} {entry['width']}w")
+    return ', '.join(candidates)
+
+
+@app.template_global()
+def font_src(path):
+    """@font-face src for a TrueType font, preferring its WOFF2 build"""
+    sources = []
+    woff2 = os.path.splitext(_asset_key(path))[0] + '.woff2'
+    if woff2 in asset_manifest:
+        sources.append(f'url("{asset_url(woff2)}") format("woff2")')
+    sources.append(f'url("{asset_url(path)}") format("truetype")')
+    return Markup(', '.join(sources))
+
+# ============================================================================
+# CATALOG
+# ============================================================================
+
 # Load archives data from individual JSON files
 
 def download_from_bucket(archive_id, max_retries=3):
@@ -60,11 +167,14 @@ def download_from_bucket(archive_id, max_retries=3):
     
     for attempt in range(max_retries):
         try:
-            response = requests.get(url, timeout=30)
+            response = requests.get(url, timeout=30, stream=True)
             response.raise_for_status()
             
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
+            # Write to a temp name so readers never see a partial file
+            with open(filepath + '.part', 'wb') as f:
+                for block in response.iter_content(chunk_size=1024 * 1024):
+                    f.write(block)
+            os.replace(filepath + '.part', filepath)
             logger.info(f"Successfully downloaded {archive_id}")
             return True
             
@@ -99,36 +209,156 @@ archive_dict = {}
 missing_files = []
 archives = []
 total_duration = 0
-def refresh_archive_dict():
-    archive_data = os.listdir('data')
-    global archive_dict, missing_files, archives, total_duration
-    for archive_file in archive_data:
-        if archive_file.endswith('.json'):
-            with open(f'data/{archive_file}', 'r') as f:
-                data = json.load(f)
-                data['genre_string'] = ', '.join(data['genres'])
-                archive_id = data['id']
-                if data['show'] == 'c' and "-2" in data['title']:
-                    data['title'] = ' - '.join(data['title'].split(' - ')[:-1])
-                data['download'] = 'https://scudbucket.sfo3.cdn.digitaloceanspaces.com/monotonic-radio/' + data['filename']
-                logger.info(f"{ARCHIVE_PATH}/{data['filename']}")
-                if os.path.exists(f"{ARCHIVE_PATH}/{data['filename']}"):
-                    archive_dict[archive_id] = data
-                else:
-                    download_from_bucket(data['filename'])
-                    archive_dict[archive_id] = data
+catalog_version = None
+
+def load_archive_file(path):
+    """Read one data/*.json record and prepare it for serving"""
+    data = schedule.read_record(path)
+    data['download'] = 'https://scudbucket.sfo3.cdn.digitaloceanspaces.com/monotonic-radio/' + data['filename']
+    data['thumbnail_url'] = asset_url(data['thumbnail'])
+    data['thumbnail_srcset'] = asset_srcset(data['thumbnail'])
+    return data
+
+
+class CatalogIndex:
+    """Prebuilt, incrementally maintained views of archive_dict.
+
+    Every list is kept sorted by date (oldest first) as records are added
+    or removed, so request handlers never scan or sort the whole catalog.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.by_date = []
+        self.by_show = collections.defaultdict(list)
+        self.by_genre = collections.defaultdict(list)
+        self.records = {}
+        self.filenames = {}
+
+    @staticmethod
+    def _date_key(record):
+        return record.get('date', '')
+
+    def _lists_for(self, record):
+        yield self.by_date
+        yield self.by_show[record['show']]
+        for genre in record['genres']:
+            yield self.by_genre[genre]
+
+    def _remove_locked(self, archive_id):
+        old = self.records.pop(archive_id, None)
+        if old:
+            self.filenames.pop(old['filename'], None)
+            for records in self._lists_for(old):
+                records.remove(old)
+
+    def add(self, record):
+        """Insert a record, replacing any previous version with the same id"""
+        with self.lock:
+            self._remove_locked(record['id'])
+            self.records[record['id']] = record
+            self.filenames[record['filename']] = record['id']
+            for records in self._lists_for(record):
+                bisect.insort(records, record, key=self._date_key)
+
+    def remove(self, archive_id):
+        with self.lock:
+            self._remove_locked(archive_id)
+
+    def has_file(self, filename):
+        """Whether `filename` is the audio file of a catalogued episode"""
+        with self.lock:
+            return filename in self.filenames
+
+    def for_shows(self, shows):
+        """Episodes of the given shows, oldest first, merged from the per-show lists"""
+        with self.lock:
+            show_lists = [list(self.by_show.get(show, [])) for show in shows]
+        return list(heapq.merge(*show_lists, key=self._date_key))
+
+    def page(self, page, page_size, show=None, genre=None):
+        """One newest-first page of the whole catalog, a show or a genre; returns (episodes, total)"""
+        with self.lock:
+            if genre is not None:
+                records = self.by_genre.get(genre, [])
+            elif show is not None:
+                records = self.by_show.get(show, [])
+            else:
+                records = self.by_date
+            end = len(records) - (page - 1) * page_size
+            return records[max(end - page_size, 0):max(end, 0)][::-1], len(records)
+
+    def search(self, query, page, page_size):
+        """Newest-first page of episodes whose title, genres or date contain `query`.
+
+        The one lookup that has to scan the catalog; plain browsing uses page().
+        """
+        query = query.lower()
+        with self.lock:
+            matches = [
+                record for record in reversed(self.by_date)
+                if query in f"{record['title']} {record['genre_string']} {record.get('date', '')}".lower()
+            ]
+        start = (page - 1) * page_size
+        return matches[start:start + page_size], len(matches)
+
+    def genre_counts(self):
+        with self.lock:
+            return {genre: len(records) for genre, records in self.by_genre.items() if records}
+
+
+catalog_index = CatalogIndex()
+
+def apply_archive_record(data):
+    """Store a loaded record in archive_dict and the catalog indexes"""
+    archive_dict[data['id']] = data
+    catalog_index.add(data)
+
+
+def remove_archive_record(archive_id):
+    archive_dict.pop(archive_id, None)
+    catalog_index.remove(archive_id)
+
+
+def rebuild_playlist_order():
+    """Recompute the derived schedule inputs after archive_dict changes"""
+    global archives, total_duration, catalog_version
+    archives, total_duration = schedule.catalog_order(archive_dict)
+    catalog_version = schedule.catalog_version(archives, archive_dict)
+
+
+def download_missing_archives():
+    """Fetch every catalog MP3 that is not on local disk yet"""
+    global missing_files
+    missing_files = []
+    for data in list(archive_dict.values()):
+        logger.info(f"{ARCHIVE_PATH}/{data['filename']}")
+        if not os.path.exists(f"{ARCHIVE_PATH}/{data['filename']}"):
+            if not download_from_bucket(data['filename']):
+                missing_files.append(data['filename'])
     logger.warning(f'MISSING {len(missing_files)} FILES')
     for i in missing_files:
         logger.warning(f'   -{i}')
 
-    archives = sorted(archive_dict.keys())
-    total_duration = sum(v['duration'] for v in archive_dict.values())
-refresh_archive_dict()
+
+def refresh_archive_dict(download=not ARCHIVE_CACHE_BYTES):
+    """Reload data/*.json; with a cache budget, ArchiveCache fetches files on demand instead"""
+    for archive_file in os.listdir('data'):
+        if archive_file.endswith('.json'):
+            apply_archive_record(load_archive_file(f'data/{archive_file}'))
+    if download:
+        download_missing_archives()
+    rebuild_playlist_order()
+
+# In scale-out mode only the elected producer downloads (see ScaleOutCoordinator),
+# and with a cache budget ArchiveCache fetches on demand instead
+refresh_archive_dict(download=not SCALE_OUT and not ARCHIVE_CACHE_BYTES)
 
 # Make users
 users = {
     os.environ.get('ADMIN_PASS', 'test'): {
         'shows':['a','c','r'],
+        'admin': True
     },
     os.environ.get('AB_PASS', 'testmiles'): {
         'shows':['a']
@@ -168,17 +398,17 @@ def get_thumbnail(archive_id):
     if 'assets/thumbnail' not in thumbnail:
         local_path = f'assets/thumbnails/{archive_id}.webp'
         if os.path.exists(local_path):
-            return local_path
+            return asset_url(local_path)
         
         # Check if remote thumbnail exists
         try:
             response = requests.head(thumbnail, timeout=0.5)
             if response.status_code == 404:
-                return 'assets/mtr.jpg'
+                return asset_url('mtr.jpg')
         except (requests.RequestException, requests.Timeout):
-            return 'assets/mtr.jpg'
+            return asset_url('mtr.jpg')
     
-    return thumbnail
+    return asset_url(thumbnail)
 
 
 def check_for_live():
@@ -224,10 +454,45 @@ def get_mp3_metadata(filepath):
     return bitrate, duration
 
 
+def analyze_upload(mp3_path, archive_id):
+    """Precompute waveform sidecar and loudness; returns (loudness, peak) or (None, None)"""
+    if analysis is None:
+        logger.warning(f"Analysis unavailable, skipping waveform for {archive_id}")
+        return None, None
+    try:
+        return analysis.analyze_archive(mp3_path, archive_id)
+    except Exception as e:
+        logger.error(f"Error analyzing {archive_id}: {e}")
+        return None, None
+
+
+def normalize_upload(mp3_path, filename, loudness, peak):
+    """Write the loudness-normalized playback copy; returns the applied gain in dB or None"""
+    normalized = normalize.normalized_path(ARCHIVE_PATH, filename)
+    if loudness is not None:
+        try:
+            return normalize.normalize_archive(mp3_path, normalized, loudness, peak)
+        except Exception as e:
+            logger.error(f"Error normalizing {filename}: {e}")
+    
+    # No new gain: a copy left by an earlier upload under this filename is stale
+    try:
+        os.remove(normalized)
+    except FileNotFoundError:
+        pass
+    return None
+
+
+def playback_path(archive):
+    """Prefer the precomputed normalized copy so streaming never processes audio"""
+    normalized = normalize.normalized_path(ARCHIVE_PATH, archive['filename'])
+    if archive.get('gain') is not None and os.path.exists(normalized):
+        return normalized
+    return ARCHIVE_PATH + '/' + archive['filename']
+
+
 def save_new_archive(archive_data):
     """Save new archive to data directory and reload archives"""
-    global archive_dict, archives, total_duration
-    
     archive_id = archive_data['id']
     filepath = f'data/{archive_id}.json'
     
@@ -235,10 +500,13 @@ def save_new_archive(archive_data):
     with open(filepath, 'w') as f:
         json.dump(archive_data, f, indent=4)
     
-    # Update in-memory data
-    archive_dict[archive_id] = archive_data
-    archives = sorted(archive_dict.keys())
-    total_duration = sum(v['duration'] for v in archive_dict.values())
+    # Update in-memory data through the same path as startup, so derived
+    # fields (download, thumbnail_url, ...) are filled in
+    if SCALE_OUT:
+        catalog_watcher.poll()  # other workers pick the change up on their own poll
+    else:
+        apply_archive_record(load_archive_file(filepath))
+        rebuild_playlist_order()
     
     logger.info(f"Added new archive: {archive_id} (total: {len(archive_dict)})")
     return True
@@ -247,91 +515,176 @@ def save_new_archive(archive_data):
 # PLAYLIST & PLAYBACK LOGIC
 # ============================================================================
 
-def get_current():
+def get_current(when=None):
     """Get currently playing track based on elapsed time - deterministic calculation"""
-    current_time = datetime.now()
-    elapsed_seconds = (current_time - BEGINNING_TIME).total_seconds()
-    
-    # Calculate which iteration we're in
-    iteration = int(elapsed_seconds // total_duration)
-    time_into_iteration = elapsed_seconds % total_duration
+    located = schedule.locate(archives, archive_dict, total_duration, when or datetime.now(), BEGINNING_TIME)
+    if not located:
+        logger.warning("Reached end of iteration without finding track")
+        return None
     
-    # Generate shuffled order for this iteration
-    shuffled = archives.copy()
-    random.Random(iteration).shuffle(shuffled)
+    _, order, index, _, archive_elapsed = located
+    archive_id = order[index]
+    v = archive_dict[archive_id]
+    byterate = v['bitrate'] / 8
+    mp3_path = playback_path(v)
     
-    # Avoid back-to-back repeats across iterations
-    if iteration > 0:
-        prev_shuffled = archives.copy()
-        random.Random(iteration - 1).shuffle(prev_shuffled)
-        
-        attempt = 0
-        while shuffled[0] == prev_shuffled[-1] and attempt < 100:
-            random.Random(iteration * 1000 + attempt).shuffle(shuffled)
-            attempt += 1
-    
-    # Find which track we're currently in
-    time_sum = 0
-    for i, archive_id in enumerate(shuffled):
-        v = archive_dict[archive_id]
-        
-        if time_sum + v['duration'] > time_into_iteration:
-            # Found the current track
-            archive_elapsed = time_into_iteration - time_sum
-            byterate = v['bitrate'] / 8
-            mp3_path = ARCHIVE_PATH + '/' + v['filename']
-            
-            return v['title'], archive_id, mp3_path, archive_elapsed, byterate, v['duration']
-        
-        time_sum += v['duration']
-    
-    logger.warning("Reached end of iteration without finding track")
-    return None
+    return v['title'], archive_id, mp3_path, archive_elapsed, byterate, v['duration']
 
 # ============================================================================
-# STREAMING LOGIC
+# ARCHIVE DISK CACHE
 # ============================================================================
 
-def stream_live(live_info, chunk_size, chunks_between_checks):
-    """Stream live content using mpv"""
-    logger.info(f"Switching to live stream: {live_info.get('name')}")
-    
-    mpv_command = [
-        "mpv",
-        "--no-video",
-        "--no-terminal",
-        "--o=-",
-        "--of=mp3",
-        "--oac=libmp3lame",
-        "--oacopts=b=128k",
-        LIVE_STREAM_URL
-    ]
-    
-    process = subprocess.Popen(
-        mpv_command,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        bufsize=chunk_size
-    )
-    
-    try:
-        chunk_count = 0
-        while True:
-            chunk_count += 1
-            
-            if chunk_count % chunks_between_checks == 0:
-                if not check_for_live():
-                    logger.info("Live stream ended, switching back to playlist")
+class ArchiveCache:
+    """Size-bounded LRU cache of archive MP3s in ARCHIVE_PATH.
+
+    A background thread prefetches whatever the deterministic schedule
+    will play in the next PREFETCH_HOURS. The current and next tracks are
+    pinned and never evicted, so playback does not miss even when only a
+    fraction of the catalog fits on disk.
+    """
+
+    def __init__(self, budget_bytes=ARCHIVE_CACHE_BYTES, archive_path=ARCHIVE_PATH):
+        self.budget_bytes = budget_bytes
+        self.archive_path = archive_path
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()  # filename -> bytes on disk, oldest first
+        self.downloads = {}                       # filename -> Event for in-flight fetches
+        self._scan()
+
+    def _disk_usage(self, filename):
+        """Bytes used by an archive, including its normalized copy"""
+        size = 0
+        for path in (os.path.join(self.archive_path, filename),
+                     normalize.normalized_path(self.archive_path, filename)):
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+
+    @staticmethod
+    def _expected_usage(archive):
+        """Estimated bytes an archive will take once fetched, like _disk_usage"""
+        size = int(archive['duration'] * archive['bitrate'] / 8)
+        if archive.get('loudness') is not None:
+            size *= 2  # the normalized copy is the same size as the original
+        return size
+
+    def _scan(self):
+        """Seed LRU order from what is already on disk, least recently accessed first"""
+        files = [entry for entry in os.scandir(self.archive_path)
+                 if entry.is_file() and entry.name.endswith('.mp3')]
+        files.sort(key=lambda entry: entry.stat().st_atime)
+        for entry in files:
+            self.entries[entry.name] = self._disk_usage(entry.name)
+
+    @property
+    def used_bytes(self):
+        return sum(self.entries.values())
+
+    def touch(self, filename):
+        """Mark an archive as just used (or newly written by an upload)"""
+        with self.lock:
+            self.entries[filename] = self._disk_usage(filename)
+            self.entries.move_to_end(filename)
+
+    def pinned(self):
+        """Filenames of the track playing now and the one after it"""
+        upcoming = itertools.islice(
+            schedule.iter_schedule(archives, archive_dict, total_duration, datetime.now(), beginning=BEGINNING_TIME), 2)
+        return {archive_dict[archive_id]['filename'] for _, _, archive_id in upcoming}
+
+    def evict(self, needed_bytes=0, protected=()):
+        """Drop least recently used, unprotected archives until needed_bytes fit.
+
+        Returns False if the budget cannot be met without touching protected files.
+        """
+        protected = set(protected) | self.pinned()
+        with self.lock:
+            used = self.used_bytes
+            for filename in list(self.entries):
+                if used + needed_bytes <= self.budget_bytes:
                     break
-            
-            chunk = process.stdout.read(chunk_size)
-            if not chunk:
-                logger.warning("Live stream ended unexpectedly")
-                break
-            
-            yield chunk
-    finally:
-        cleanup_process(process)
+                if filename in protected:
+                    continue
+                for path in (os.path.join(self.archive_path, filename),
+                             normalize.normalized_path(self.archive_path, filename)):
+                    if os.path.exists(path):
+                        os.remove(path)
+                used -= self.entries.pop(filename)
+                logger.info(f"Evicted {filename} from archive cache")
+            return used + needed_bytes <= self.budget_bytes
+
+    def ensure(self, archive, protected=()):
+        """Make sure an archive is on disk, downloading it if needed; returns True on success"""
+        filename = archive['filename']
+        if os.path.exists(os.path.join(self.archive_path, filename)):
+            self.touch(filename)
+            return True
+
+        # Coalesce concurrent requests for the same file onto one download
+        with self.lock:
+            in_flight = self.downloads.get(filename)
+            if not in_flight:
+                self.downloads[filename] = threading.Event()
+        if in_flight:
+            in_flight.wait()
+            return os.path.exists(os.path.join(self.archive_path, filename))
+
+        try:
+            expected = self._expected_usage(archive)
+            if not self.evict(expected, set(protected) | {filename}):
+                logger.warning(f"Archive cache over budget while fetching {filename}")
+            if not download_from_bucket(filename):
+                return False
+            if archive.get('loudness') is not None:
+                # Regaining the normalized copy is a cheap frame edit, not a re-encode
+                normalize_upload(os.path.join(self.archive_path, filename), filename,
+                                 archive['loudness'], archive.get('peak'))
+            self.touch(filename)
+            return True
+        finally:
+            with self.lock:
+                self.downloads.pop(filename).set()
+
+    def prefetch(self, hours=PREFETCH_HOURS):
+        """Download upcoming tracks in play order until the window or the budget runs out"""
+        now = datetime.now()
+        window = []
+        for _, _, archive_id in schedule.iter_schedule(archives, archive_dict, total_duration, now,
+                                                       now + timedelta(hours=hours), BEGINNING_TIME):
+            archive = archive_dict[archive_id]
+            if archive['filename'] in window:
+                continue
+            window.append(archive['filename'])
+
+            if os.path.exists(os.path.join(self.archive_path, archive['filename'])):
+                self.touch(archive['filename'])
+                continue
+
+            expected = self._expected_usage(archive)
+            if not self.evict(expected, set(window)):
+                logger.info(f"Archive cache full, prefetched {len(window) - 1} upcoming tracks")
+                return
+            self.ensure(archive, set(window))
+
+    def _prefetch_loop(self):
+        while True:
+            try:
+                self.prefetch()
+            except Exception as e:
+                logger.error(f"Archive prefetch error: {e}", exc_info=True)
+            time.sleep(PREFETCH_INTERVAL_SECONDS)
+
+    def start(self):
+        logger.info(f"Archive cache: {self.used_bytes / 1e9:.2f} of {self.budget_bytes / 1e9:.2f} GB used")
+        thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+        thread.start()
+
+
+# ============================================================================
+# STREAMING LOGIC
+# ============================================================================
 
 def stream_playlist(chunk_size, chunks_between_checks, skip_track_id=None):
     """Stream archived content using ffmpeg"""
@@ -351,8 +704,9 @@ def stream_playlist(chunk_size, chunks_between_checks, skip_track_id=None):
             return
         current_video, track_id, mp3_path, video_elapsed, bitrate, duration = current_result
     
-    if not os.path.exists(mp3_path):
-        logger.warning(f"File not found: {mp3_path}")
+    mp3_path = ensure_playable(track_id, mp3_path)
+    if not mp3_path:
+        logger.warning(f"File not found for {track_id}")
         time.sleep(0.5)
         return
     
@@ -410,136 +764,312 @@ def stream_playlist(chunk_size, chunks_between_checks, skip_track_id=None):
     finally:
         cleanup_process(process)
 
+def ensure_playable(track_id, mp3_path):
+    """Return a local path for the track, fetching it through the cache on a miss"""
+    if os.path.exists(mp3_path):
+        if archive_cache:
+            archive_cache.touch(archive_dict[track_id]['filename'])
+        return mp3_path
+    if archive_cache and archive_cache.ensure(archive_dict[track_id]):
+        return playback_path(archive_dict[track_id])
+    return None
+
 CHUNK_SIZE = 8192
-CHUNKS_BETWEEN_CHECKS = 25
 BUFFER_SECONDS = 4
-def stream_simple():
-    first_open = True
-    track_over = False
-    need_to_switch_to_archive = False
+TICK_SECONDS = 0.25               # audio handed to listeners per publish
+SCHEDULE_CHECK_SECONDS = 5
+LIVE_POLL_SECONDS = 1
+LIVE_WARM_SECONDS = 2             # buffered live audio required before switching over
+LIVE_MAX_BUFFER_SECONDS = 10
+LIVE_RESTART_SECONDS = 5
+LIVE_STATUS_MAX_AGE = 5           # followers ignore a status file the producer stopped refreshing
 
-    while True:
+class LiveRelay:
+    """mpv relaying the Icecast source as MP3 frames, pre-warmed before we switch to it"""
 
-        if check_for_live():
-            logger.info("Live stream detected, switching")  
-            need_to_switch_to_archive = True # flag so the next block knows to reopen the file
-            
-            mpv_command = [
-                "mpv",
-                "--no-video",
-                "--no-terminal",
-                "--o=-",
-                "--of=mp3",
-                "--oac=libmp3lame",
-                "--oacopts=b=128k",
-                LIVE_STREAM_URL
-            ]
-            
-            process = subprocess.Popen(
-                mpv_command,
+    def __init__(self):
+        self.process = None
+        self.frames = collections.deque(maxlen=int(LIVE_MAX_BUFFER_SECONDS * 40))  # ~26ms frames
+        self.buffered = 0.0
+        self.primed = False
+        self.started_at = 0
+        self.condition = threading.Condition()
+
+    @property
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    @property
+    def ready(self):
+        """True once enough live audio is buffered for a gapless handover"""
+        return self.running and self.primed
+
+    def warm(self):
+        """Start relaying in the background (no-op if already running)"""
+        with self.condition:
+            if self.running or time.monotonic() - self.started_at < LIVE_RESTART_SECONDS:
+                return
+            logger.info("Live source mounting, pre-warming relay")
+            self.frames.clear()
+            self.buffered = 0.0
+            self.primed = False
+            self.started_at = time.monotonic()
+            self.process = subprocess.Popen(
+                [
+                    "mpv",
+                    "--no-video",
+                    "--no-terminal",
+                    "--o=-",
+                    "--of=mp3",
+                    "--oac=libmp3lame",
+                    "--oacopts=b=128k",
+                    LIVE_STREAM_URL
+                ],
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
                 bufsize=CHUNK_SIZE
             )
-            
-            chunk_count = 0
-            while True:
-                chunk_count += 1
-                
-                if chunk_count % CHUNKS_BETWEEN_CHECKS == 0:
-                    if not check_for_live():
-                        logger.info("Live stream ended, switching back to playlist")
-                        break
-                
-                chunk = process.stdout.read(CHUNK_SIZE)
-                if not chunk:
-                    logger.warning("Live stream ended unexpectedly")
-                    break
-                
-                yield chunk
-            
-            break
+        thread = threading.Thread(target=self._read_loop, args=(self.process,), daemon=True)
+        thread.start()
 
-        else:
-            current, track_id, mp3_path, elapsed, byterate, duration = get_current()
-            start_chunk = round(elapsed * byterate)
-            
-            logger.info(current)
-            logger.info(f'START CHUNK: {start_chunk}')
-            logger.info(f'elapsed: {elapsed}')
-            logger.info(f'duration: {duration}')
-            logger.info(f'total chunks: {round(duration * byterate)}')
-            
-            last_check_for_current = time.time()
-
-            if first_open or track_over or need_to_switch_to_archive:
-
-                need_to_switch_to_archive = False
-                with open(mp3_path, 'rb') as f:
-                    f.seek(start_chunk)
-                    
-                    # pre-yield a buffer burst to fill client's buffer
-                    prebuffer = f.read(int(byterate * BUFFER_SECONDS))
-                    yield prebuffer
-                    
-                    # now pace the rest at real playback speed
-                    live_detected = False
-                    while chunk := f.read(1024):
-                        yield chunk
-                        time.sleep(1024 / byterate)
-
-                        if (time.time() - last_check_for_current >= 5):
-                            _, _, _, elapsed_check, _, _ = get_current()
-                            last_check_for_current = time.time()
-                            if (duration - elapsed_check) <= 1:
-                                track_over = True
-                                break
-                            if check_for_live():
-                                live_detected = True
-                                break
-                    
-                    if live_detected:
-                        break
-                        
-        time.sleep(3)
+    def _read_loop(self, process):
+        for frame, header in mp3frames.read_frames(process.stdout, CHUNK_SIZE):
+            with self.condition:
+                if process is not self.process:
+                    return
+                self.frames.append((frame, header.duration))
+                self.buffered += header.duration
+                if self.buffered >= LIVE_WARM_SECONDS:
+                    self.primed = True
+                self.condition.notify_all()
+        logger.warning("Live relay ended")
+        with self.condition:
+            self.condition.notify_all()
+
+    def next_frame(self, timeout=1):
+        """Pop the next (frame, duration), or None if the relay stalled or ended"""
+        with self.condition:
+            if not self.frames:
+                self.condition.wait(timeout)
+            if not self.frames:
+                return None
+            return self.frames.popleft()
+
+    def stop(self):
+        with self.condition:
+            process, self.process = self.process, None
+            self.frames.clear()
+            self.primed = False
+        if process:
+            logger.info("Stopping live relay")
+            cleanup_process(process)
+
+
+class LiveMonitor:
+    """Live status for every consumer in this process, refreshed once a second.
+
+    Only the process producing audio (the one given a relay) polls Icecast.
+    With a status_path it publishes each result there, and processes
+    without a relay (scale-out followers) read that file instead, the same
+    way they pick up catalog changes from data/.
+    """
+
+    def __init__(self, relay=None, status_path=None):
+        self.info = None
+        self.relay = relay
+        self.status_path = status_path
+
+    def _publish(self, info):
+        tmp_path = f'{self.status_path}.{os.getpid()}'
+        with open(tmp_path, 'w') as f:
+            json.dump(info, f)
+        os.replace(tmp_path, self.status_path)
+
+    def _read_published(self):
+        try:
+            if time.time() - os.path.getmtime(self.status_path) > LIVE_STATUS_MAX_AGE:
+                return None  # producer gone
+            with open(self.status_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _poll_loop(self):
+        while True:
+            if self.relay:
+                info = check_for_live()
+                if self.status_path:
+                    try:
+                        self._publish(info)
+                    except OSError as e:
+                        logger.error(f"Could not publish live status: {e}")
+            elif self.status_path:
+                info = self._read_published()
+            else:
+                info = None
+
+            if info and not self.info:
+                logger.info(f"Live source detected: {info.get('name')}")
+            self.info = info
+            if self.relay:
+                if info:
+                    self.relay.warm()
+                elif self.relay.running:
+                    self.relay.stop()
+            time.sleep(LIVE_POLL_SECONDS)
+
+    def start(self):
+        thread = threading.Thread(target=self._poll_loop, daemon=True)
+        thread.start()
+
+
+class ArchiveSource:
+    """Whole MP3 frames of one archive, starting at a schedule offset"""
+
+    def __init__(self, track_id, mp3_path, elapsed, byterate):
+        self.track_id = track_id
+        self.file = open(mp3_path, 'rb')
+        self.file.seek(max(round(elapsed * byterate), 0))
+        self.frames = mp3frames.read_frames(self.file)
+
+    def next_frame(self):
+        """Next (frame, duration), or None at end of file"""
+        frame = next(self.frames, None)
+        if frame is None:
+            return None
+        data, header = frame
+        return data, header.duration
+
+    def close(self):
+        self.file.close()
+
+
+def open_archive_at(when, after_track=None):
+    """ArchiveSource for whatever the schedule plays at `when`.
+
+    If that is still `after_track` (its file ran out slightly early), the
+    following track starts from the top instead.
+    """
+    upcoming = schedule.iter_schedule(archives, archive_dict, total_duration, when, beginning=BEGINNING_TIME)
+    # The schedule never ends: give up after one pass rather than skip forever
+    for track_start, _, track_id in itertools.islice(upcoming, len(archives) + 1):
+        if track_id == after_track:
+            continue
+        elapsed = max((when - track_start).total_seconds(), 0)
+        archive = archive_dict[track_id]
+        mp3_path = ensure_playable(track_id, playback_path(archive))
+        if not mp3_path:
+            logger.warning(f"File not found for {track_id}, skipping")
+            after_track = track_id
+            continue
+        logger.info(f"Audio {track_id}: {archive['title']} from {elapsed:.1f}s")
+        return ArchiveSource(track_id, mp3_path, elapsed, archive['bitrate'] / 8)
+    return None
+
+
+def stream_simple():
+    """One continuous MP3 stream that never ends across live/archive transitions.
+
+    Sources are switched between whole frames, so listeners keep a single
+    HTTP response. Live takes over once the pre-warmed relay has buffered
+    enough audio; when it drops, the archive resumes at the exact schedule
+    offset. Output is paced to stay BUFFER_SECONDS ahead of real time.
+    """
+    archive = None
+    finished = None  # track whose file ran out before its scheduled end
+    on_live = False
+    sent = 0.0
+    clock = time.monotonic()
+    last_schedule_check = clock
+
+    while True:
+        tick = []
+        tick_duration = 0.0
+        while tick_duration < TICK_SECONDS:
+            # Schedule instant of the audio being emitted right now
+            ahead = sent + tick_duration - (time.monotonic() - clock)
+            stream_time = datetime.now() + timedelta(seconds=ahead)
+
+            if live_monitor.info and live_relay.ready:
+                if not on_live:
+                    logger.info("Switching to live at frame boundary")
+                    on_live = True
+                    finished = None
+                    if archive:
+                        archive.close()
+                        archive = None
+                frame = live_relay.next_frame()
+                if frame is None:
+                    logger.warning("Live relay stalled, falling back to archive")
+                    live_relay.stop()
+                    continue
+            else:
+                if on_live:
+                    logger.info("Live ended, resuming archive at schedule offset")
+                    on_live = False
+                if archive and time.monotonic() - last_schedule_check >= SCHEDULE_CHECK_SECONDS:
+                    # Catalog edits can reshuffle the schedule under us
+                    last_schedule_check = time.monotonic()
+                    current = get_current(stream_time)
+                    if current and current[1] != finished:
+                        finished = None
+                    if current and current[1] not in (archive.track_id, finished):
+                        logger.info(f"Track switch: {archive.track_id} -> {current[1]}")
+                        archive.close()
+                        archive = None
+                if archive is None:
+                    archive = open_archive_at(stream_time, after_track=finished)
+                    if archive is None:
+                        logger.error("Nothing playable in the schedule")
+                        time.sleep(1)
+                        continue
+                frame = archive.next_frame()
+                if frame is None:
+                    finished = archive.track_id
+                    archive.close()
+                    archive = open_archive_at(stream_time, after_track=finished)
+                    continue
+
+            tick.append(frame[0])
+            tick_duration += frame[1]
+
+        yield b''.join(tick)
+        sent += tick_duration
+
+        ahead = sent - (time.monotonic() - clock)
+        if ahead < 0:
+            clock = time.monotonic() - sent  # source stalled; don't burst to catch up
+        elif ahead > BUFFER_SECONDS:
+            time.sleep(ahead - BUFFER_SECONDS)
 
 class StreamBroadcaster:
-    def __init__(self):
+    def __init__(self, relay=None):
         self.clients = set()
-        self.lock = threading.Lock()
-        self.buffer = collections.deque(maxlen=10)
+        self.lock = profiling.make_lock('broadcaster')
+        self.buffer = collections.deque(maxlen=int(BUFFER_SECONDS / TICK_SECONDS))
+        self.relay = relay
+    
+    def publish(self, chunk):
+        """Hand one chunk to every connected client (and the host relay, if any)"""
+        with self.lock:
+            # Under the lock so add_client() never iterates a deque being appended to
+            self.buffer.append(chunk)
+            dead_clients = set()
+            for client_queue in self.clients:
+                try:
+                    client_queue.put_nowait(chunk)
+                except:
+                    dead_clients.add(client_queue)
+            self.clients -= dead_clients
+        if self.relay:
+            self.relay.publish(chunk)
     
     def _generate_master_stream(self):
         """The ONE stream that feeds everyone"""
-        CHUNK_SIZE = 8192
-        CHUNKS_BETWEEN_CHECKS = 25
-        last_track_id = None
-        
         while True:
             try:
-                live_info = check_for_live()
-                if live_info:
-                    stream_generator = stream_live(live_info, CHUNK_SIZE, CHUNKS_BETWEEN_CHECKS)
-                    logger.info('Switching to Live')
-                else:
-                    stream_generator = stream_simple()
-                    logger.info('Switching to Archive')
-
-                for chunk in stream_generator:
-                    self.buffer.append(chunk)
-                    with self.lock:
-                        dead_clients = set()
-                        for client_queue in self.clients:
-                            try:
-                                client_queue.put_nowait(chunk)
-                            except:
-                                dead_clients.add(client_queue)
-                        self.clients -= dead_clients
-
-                result = get_current()
-                if result:
-                    last_track_id = result[1] 
-
+                for chunk in stream_simple():
+                    self.publish(chunk)
             except Exception as e:
                 logger.error(f"Broadcast error: {e}", exc_info=True)
                 time.sleep(1)
@@ -562,6 +1092,273 @@ class StreamBroadcaster:
         with self.lock:
             self.clients.discard(client_queue)
 
+# ============================================================================
+# SCALE-OUT (one producer per host, many fan-out workers)
+# ============================================================================
+
+class HostRelay:
+    """Producer side of the local Unix socket that carries the encoded broadcast"""
+
+    def __init__(self, socket_path=RELAY_SOCKET_PATH):
+        self.socket_path = socket_path
+        self.followers = set()
+        self.lock = profiling.make_lock('host_relay')
+
+    def start(self):
+        """Bind the socket and accept follower workers in a background thread"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # stale socket from a dead producer
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen(64)
+        thread = threading.Thread(target=self._accept_loop, args=(server,), daemon=True)
+        thread.start()
+
+    def _accept_loop(self, server):
+        while True:
+            conn, _ = server.accept()
+            conn.settimeout(1)  # a stuck follower must not stall the producer
+            with self.lock:
+                self.followers.add(conn)
+            logger.info(f"Relay follower connected ({len(self.followers)} total)")
+
+    def publish(self, chunk):
+        with self.lock:
+            dead_followers = set()
+            for conn in self.followers:
+                try:
+                    conn.sendall(chunk)
+                except OSError:
+                    dead_followers.add(conn)
+            for conn in dead_followers:
+                conn.close()
+            self.followers -= dead_followers
+
+
+class CatalogWatcher:
+    """Propagate data/*.json changes made by any process into this worker's catalog"""
+
+    def __init__(self, data_dir='data'):
+        self.data_dir = data_dir
+        self.mtimes = self._scan()
+        self.lock = threading.Lock()
+
+    def _scan(self):
+        return {
+            entry.name: entry.stat().st_mtime_ns
+            for entry in os.scandir(self.data_dir)
+            if entry.name.endswith('.json')
+        }
+
+    def poll(self):
+        """Apply added, changed and removed records; returns True if anything changed"""
+        with self.lock:
+            current = self._scan()
+            changed = [name for name, mtime in current.items() if self.mtimes.get(name) != mtime]
+            removed = [name for name in self.mtimes if name not in current]
+            self.mtimes = current
+            if not changed and not removed:
+                return False
+
+            for name in changed:
+                try:
+                    data = load_archive_file(f'{self.data_dir}/{name}')
+                except (OSError, ValueError) as e:
+                    # File may still be mid-write; pick it up on the next poll
+                    logger.warning(f"Could not load {name}: {e}")
+                    del self.mtimes[name]
+                    continue
+                apply_archive_record(data)
+            for name in removed:
+                remove_archive_record(name[:-len('.json')])
+            rebuild_playlist_order()
+
+        logger.info(f"Catalog updated: {len(changed)} changed, {len(removed)} removed (total: {len(archive_dict)})")
+        return True
+
+    def _watch_loop(self):
+        while True:
+            time.sleep(CATALOG_POLL_SECONDS)
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Catalog watch error: {e}")
+
+    def start(self):
+        thread = threading.Thread(target=self._watch_loop, daemon=True)
+        thread.start()
+
+
+class ScaleOutCoordinator:
+    """Elect one producer per host via a file lock; everyone else follows its relay"""
+
+    def __init__(self, broadcaster, lock_path=PRODUCER_LOCK_PATH, socket_path=RELAY_SOCKET_PATH):
+        self.broadcaster = broadcaster
+        self.lock_path = lock_path
+        self.socket_path = socket_path
+        self.lock_file = None
+        self.is_producer = False
+
+    def _try_become_producer(self):
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        # Held for the life of the process; the kernel releases it if we die
+        self.lock_file = lock_file
+        return True
+
+    def _produce(self):
+        logger.info(f"Elected stream producer (pid {os.getpid()})")
+        self.is_producer = True
+        if archive_cache:
+            archive_cache.start()
+        else:
+            download_missing_archives()
+        live_monitor.relay = live_relay
+        relay = HostRelay(self.socket_path)
+        relay.start()
+        self.broadcaster.relay = relay
+        self.broadcaster._generate_master_stream()
+
+    def _follow(self):
+        """Read the producer's broadcast until the connection drops"""
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conn.connect(self.socket_path)
+        except OSError:
+            conn.close()
+            return
+        logger.info(f"Following stream producer (pid {os.getpid()})")
+        try:
+            while chunk := conn.recv(CHUNK_SIZE):
+                self.broadcaster.publish(chunk)
+        except OSError as e:
+            logger.warning(f"Relay connection lost: {e}")
+        finally:
+            conn.close()
+
+    def _run(self):
+        while True:
+            if self._try_become_producer():
+                self._produce()  # never returns
+            self._follow()
+            time.sleep(1)  # producer gone or not up yet; retry the election
+
+    def start(self):
+        thread = threading.Thread(target=self._run, daemon=True)
+        thread.start()
+
+
+# ============================================================================
+# ARCHIVE FILE SERVING (origin fallback for the CDN)
+# ============================================================================
+
+ARCHIVE_SEND_BLOCK = 256 * 1024
+ARCHIVE_INFO_TTL = 1.0
+ARCHIVE_CACHE_CONTROL = 'public, max-age=86400'
+WAVEFORM_MAX_AGE = 86400
+
+
+class ArchiveFileInfo:
+    """Size and validators for one archive file, shared by concurrent requests"""
+
+    def __init__(self, path, stat_result):
+        self.path = path
+        self.size = stat_result.st_size
+        self.mtime = stat_result.st_mtime
+        self.etag = f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+        self.checked_at = time.monotonic()
+
+
+_archive_info_cache = {}
+_archive_info_lock = threading.Lock()
+
+def get_archive_file_info(filename):
+    """Resolve a catalogued archive filename to its cached ArchiveFileInfo, or None.
+
+    Thousands of seeks against the same file share one stat() per
+    ARCHIVE_INFO_TTL instead of each hitting the filesystem.
+    """
+    filename = secure_filename(filename)
+    if not filename.endswith('.mp3') or not catalog_index.has_file(filename):
+        return None  # never expose .part downloads or anything else in ARCHIVE_PATH
+    
+    with _archive_info_lock:
+        info = _archive_info_cache.get(filename)
+        if info and time.monotonic() - info.checked_at < ARCHIVE_INFO_TTL:
+            return info
+        
+        path = os.path.join(ARCHIVE_PATH, filename)
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            _archive_info_cache.pop(filename, None)
+            return None
+        
+        info = ArchiveFileInfo(path, stat_result)
+        _archive_info_cache[filename] = info
+        return info
+
+
+def parse_byte_range(header, size):
+    """Parse a single-range 'bytes=' header into (start, end) inclusive.
+
+    Returns None when the header should be ignored (absent, malformed or
+    multi-range) and raises ValueError when the range is unsatisfiable.
+    """
+    if not header or not header.startswith('bytes=') or ',' in header:
+        return None
+    
+    start, _, end = header[len('bytes='):].strip().partition('-')
+    try:
+        if start:
+            start = int(start)
+            end = int(end) if end else size - 1
+        elif end:
+            # Suffix range: the last N bytes
+            start = max(size - int(end), 0)
+            end = size - 1
+        else:
+            return None
+    except ValueError:
+        return None
+    
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+
+class RangeFile:
+    """File-like view of [start, start + length) that servers can sendfile().
+
+    Gunicorn's wsgi.file_wrapper calls os.sendfile() on fileno() starting at
+    the current offset for Content-Length bytes; servers without sendfile
+    fall back to read(), which is capped at the end of the range.
+    """
+
+    def __init__(self, path, start, length):
+        self.file = open(path, 'rb')
+        self.file.seek(start)
+        self.remaining = length
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
 
 # ============================================================================
 # FLASK ROUTES
@@ -578,8 +1375,8 @@ def index():
     genres = ', '.join(archive_dict[archive_id]['genres'])
     description = archive_dict[archive_id]['description'].replace('\n', '<br>')
     
-    all_episodes = sorted(archive_dict.values(), key=lambda d: d['date'], reverse=True)
-    pages = (len(all_episodes) // 9) + 1
+    episodes, total = catalog_index.page(1, EPISODES_PER_PAGE)
+    pages = max((total + EPISODES_PER_PAGE - 1) // EPISODES_PER_PAGE, 1)
 
     return render_template(
         'index.html',
@@ -587,29 +1384,15 @@ def index():
         genres=genres,
         description=description,
         thumbnail=get_thumbnail(archive_id),
-        episodes=all_episodes,
-        all_episodes=all_episodes,
+        episodes=episodes,
         pages = pages
     )
 
 
 @app.route('/stream')
 def stream():
-   
-   '''
-    client_queue = broadcaster.add_client()
-    
-    def generate():
-        try:
-            while True:
-                chunk = client_queue.get(timeout=30)
-                yield chunk
-        except:
-            pass
-        finally:
-            broadcaster.remove_client(client_queue)'''
-   return Response(
-        stream_simple(),
+    return Response(
+        broadcast_to_client(),
         mimetype='audio/mpeg',
         headers={
             'Cache-Control': 'no-cache, no-store, must-revalidate',
@@ -619,10 +1402,22 @@ def stream():
         }
     )
 
+
+def broadcast_to_client():
+    """Fan the shared broadcast out to one listener"""
+    client_queue = broadcaster.add_client()
+    try:
+        while True:
+            yield client_queue.get(timeout=30)
+    except queue.Empty:
+        logger.warning("No broadcast data for 30s, closing listener")
+    finally:
+        broadcaster.remove_client(client_queue)
+
 @app.route('/info')
 def get_info():
     """API endpoint for current track info"""
-    live_info = check_for_live()
+    live_info = live_monitor.info
     
     if live_info:
         return {
@@ -652,11 +1447,257 @@ def get_info():
         'byterate': byterate,
         'thumbnail': get_thumbnail(archive_id),
         'id':archive_id,
+        'loudness': archive_dict[archive_id].get('loudness'),
+        'waveform': f'/waveforms/{archive_id}' if 'loudness' in archive_dict[archive_id] else None,
         'download':f'https://scudbucket.sfo3.cdn.digitaloceanspaces.com/monotonic-radio/{mp3_path.split('/')[-1]}',
         'source': 'archive'
     }
 
 
+@app.route('/archives/<filename>')
+def serve_archive(filename):
+    """Serve an archive MP3 from local disk with Range/If-Range and ETag support"""
+    info = get_archive_file_info(filename)
+    if not info:
+        return {'error': 'Archive not found'}, 404
+    
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': info.etag,
+        'Last-Modified': http_date(info.mtime),
+        'Cache-Control': ARCHIVE_CACHE_CONTROL
+    }
+    
+    if info.etag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers=headers)
+    
+    # If-Range: only honour the range if the client's copy is still current
+    if_range = request.headers.get('If-Range')
+    range_header = request.headers.get('Range')
+    if if_range and if_range != info.etag and if_range != headers['Last-Modified']:
+        range_header = None
+    
+    try:
+        byte_range = parse_byte_range(range_header, info.size)
+    except ValueError:
+        headers['Content-Range'] = f'bytes */{info.size}'
+        return Response(status=416, headers=headers)
+    
+    if byte_range:
+        start, end = byte_range
+        status = 206
+        headers['Content-Range'] = f'bytes {start}-{end}/{info.size}'
+    else:
+        start, end = 0, info.size - 1
+        status = 200
+    
+    length = end - start + 1
+    headers['Content-Length'] = str(length)
+    body = wrap_file(request.environ, RangeFile(info.path, start, length), ARCHIVE_SEND_BLOCK)
+    return Response(body, status=status, mimetype='audio/mpeg', headers=headers, direct_passthrough=True)
+
+
+@app.route('/dist/<path:filename>')
+def serve_asset(filename):
+    """Fingerprinted build output: cached forever, precompressed copy picked by Accept-Encoding"""
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encodings = asset_encodings.get(filename, [])
+    for encoding in encodings:
+        if request.accept_encodings[encoding]:
+            response = send_from_directory(ASSET_DIST_DIR, filename + assetbuild.ENCODING_SUFFIXES[encoding], mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(ASSET_DIST_DIR, filename, mimetype=mimetype)
+    
+    if encodings:
+        response.vary.add('Accept-Encoding')
+    response.headers['Cache-Control'] = ASSET_CACHE_CONTROL
+    return response
+
+
+@app.route('/episodes')
+def get_episodes():
+    """Paged episode listing for one show or genre, or matching a search query `q`, served from the catalog indexes"""
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', EPISODES_PER_PAGE)), 1), 100)
+    except ValueError:
+        return {'error': 'page and per_page must be integers'}, 400
+    
+    query = request.args.get('q', '').strip()
+    if query:
+        episodes, total = catalog_index.search(query, page, per_page)
+    else:
+        episodes, total = catalog_index.page(page, per_page, show=request.args.get('show'), genre=request.args.get('genre'))
+    return {
+        'episodes': episodes,
+        'page': page,
+        'pages': (total + per_page - 1) // per_page,
+        'total': total
+    }
+
+
+@app.route('/genres')
+def get_genres():
+    """Genre -> episode count, for browsing without loading the whole catalog"""
+    return catalog_index.genre_counts()
+
+
+@app.route('/schedule')
+def get_schedule():
+    """Redirect a requested guide window to its immutable, versioned URL"""
+    try:
+        hours = int(request.args.get('hours', SCHEDULE_DEFAULT_HOURS))
+        start = request.args.get('start')
+        start = datetime.fromisoformat(start) if start else datetime.now()
+    except ValueError:
+        return {'error': 'start must be ISO 8601 and hours an integer'}, 400
+    
+    hours = min(max(hours, 1), SCHEDULE_MAX_HOURS)
+    start = start.replace(minute=0, second=0, microsecond=0)
+    response = redirect(f'/schedule/{catalog_version}/{int(start.timestamp())}/{hours}')
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+
+@app.route('/schedule/<version>/<int:start>/<int:hours>')
+def get_schedule_window(version, start, hours):
+    """Exact upcoming sequence for one window of one catalog version"""
+    if version != catalog_version:
+        # The schedule for an older catalog can no longer be reproduced
+        return {'error': 'Catalog has changed', 'catalog_version': catalog_version}, 404, {'Cache-Control': 'no-cache'}
+    if not 1 <= hours <= SCHEDULE_MAX_HOURS:
+        return {'error': f'hours must be between 1 and {SCHEDULE_MAX_HOURS}'}, 400
+    try:
+        datetime.fromtimestamp(start) + timedelta(hours=hours)
+    except (ValueError, OverflowError, OSError):
+        return {'error': 'start is out of range'}, 400
+    
+    try:
+        document = render_schedule_window(version, start, hours)
+    except CatalogChanged:
+        return {'error': 'Catalog has changed', 'catalog_version': catalog_version}, 404, {'Cache-Control': 'no-cache'}
+    
+    return Response(
+        document,
+        mimetype='application/json',
+        headers={
+            'Cache-Control': 'public, max-age=31536000, immutable',
+            'ETag': f'"{version}-{start}-{hours}"'
+        }
+    )
+
+
+class CatalogChanged(Exception):
+    """The catalog no longer matches the requested schedule version"""
+
+
+@functools.lru_cache(maxsize=256)
+def render_schedule_window(version, start, hours):
+    """Serialized guide document; the version in the key keeps stale catalogs out.
+
+    Renders from one snapshot of the catalog and checks that snapshot
+    against `version`, so an edit landing mid-request is never cached
+    under the old version (exceptions are not cached by lru_cache).
+    """
+    catalog = dict(archive_dict)
+    order, duration = schedule.catalog_order(catalog)
+    if schedule.catalog_version(order, catalog) != version:
+        raise CatalogChanged(version)
+    
+    window_start = datetime.fromtimestamp(start)
+    window_end = window_start + timedelta(hours=hours)
+    
+    entries = []
+    for track_start, track_end, archive_id in schedule.iter_schedule(
+            order, catalog, duration, window_start, window_end, BEGINNING_TIME):
+        archive = catalog[archive_id]
+        entries.append({
+            'id': archive_id,
+            'title': archive['title'],
+            'show': archive['show'],
+            'genres': archive['genres'],
+            'start': track_start.isoformat(),
+            'end': track_end.isoformat(),
+            'start_ts': track_start.timestamp(),
+            'end_ts': track_end.timestamp()
+        })
+    
+    return json.dumps({
+        'catalog_version': version,
+        'start': window_start.isoformat(),
+        'end': window_end.isoformat(),
+        'tracks': entries
+    })
+
+
+@app.route('/waveforms/<archive_id>')
+def serve_waveform(archive_id):
+    """Precomputed waveform/loudness sidecar for an archive"""
+    if analysis is None:
+        return {'error': 'Waveforms unavailable'}, 404
+    return send_from_directory(
+        analysis.WAVEFORM_DIR,
+        f'{secure_filename(archive_id)}.peaks',
+        mimetype='application/octet-stream',
+        max_age=WAVEFORM_MAX_AGE
+    )
+
+
+@app.route('/admin/profile')
+def admin_profile():
+    """Sample every thread for N seconds and return collapsed stacks"""
+    if not profiling.PROFILING_ENABLED:
+        return {'error': 'Profiling disabled'}, 404
+    if not flask_session.get('admin'):
+        return redirect('/login?page=admin/profile')
+    
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval', profiling.DEFAULT_INTERVAL * 1000)) / 1000
+    except ValueError:
+        return {'error': 'seconds and interval must be numbers'}, 400
+    
+    if not profiling.profile_lock.acquire(blocking=False):
+        return {'error': 'A profile is already running'}, 409
+    try:
+        counts = profiling.sample_stacks(seconds, max(interval, 0.001))
+    finally:
+        profiling.profile_lock.release()
+    
+    if request.args.get('format') == 'json':
+        return {'samples': sum(counts.values()), 'stacks': dict(counts.most_common())}
+    return Response(profiling.collapsed(counts), mimetype='text/plain')
+
+
+@app.route('/admin/stacks')
+def admin_stacks():
+    """Current stack of every thread, plus the broadcaster's lock contention"""
+    if not profiling.PROFILING_ENABLED:
+        return {'error': 'Profiling disabled'}, 404
+    if not flask_session.get('admin'):
+        return redirect('/login?page=admin/stacks')
+    
+    report = '\n'.join(
+        f"{lock['name']}: {lock['acquisitions']} acquisitions, {lock['contended']} contended, "
+        f"{lock['total_wait_ms']}ms total wait, {lock['max_wait_ms']}ms max wait"
+        for lock in profiling.lock_report()
+    )
+    listeners = f"{len(broadcaster.clients)} listeners"
+    return Response(f"{listeners}\n{report}\n\n{profiling.dump_stacks()}", mimetype='text/plain')
+
+
+@app.route('/admin/locks')
+def admin_locks():
+    """Lock contention counters as JSON"""
+    if not profiling.PROFILING_ENABLED:
+        return {'error': 'Profiling disabled'}, 404
+    if not flask_session.get('admin'):
+        return redirect('/login?page=admin/locks')
+    return {'listeners': len(broadcaster.clients), 'locks': profiling.lock_report()}
+
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     """Admin login page"""
@@ -666,6 +1707,7 @@ def login():
         if password in list(users.keys()):
             flask_session['authenticated'] = True
             flask_session['user_shows'] = users[password]['shows']
+            flask_session['admin'] = users[password].get('admin', False)
             logger.warning(flask_session.get('user_shows'))
             page = request.args.get('page', 'upload')
             return redirect(f'/{page}')
@@ -675,13 +1717,7 @@ def login():
     return render_template('login.html')
 
 def get_user_episodes(user_shows):
-    user_episodes = []
-    for id, val in archive_dict.items():
-        if val['show'] in user_shows:
-            val['genre_string'] = ', '.join(val['genres'])
-            user_episodes.append(val)    
-    user_episodes = sorted(user_episodes, key=lambda d: d['date'])
-    return user_episodes
+    return catalog_index.for_shows(user_shows)
 
 @app.template_filter('dateformat')
 def dateformat(value):
@@ -699,9 +1735,8 @@ def upload():
     episode_to_edit = request.args.get('episode')
     if request.method == 'GET':
         if episode_to_edit:
-            editing = archive_dict[episode_to_edit]
-            if 'date' not in editing.keys():
-                editing['date'] = ''
+            editing = dict(archive_dict[episode_to_edit])
+            editing.setdefault('date', '')
             return render_template('upload.html', shows=user_shows, episodes=user_episodes, editing=editing)
         else:
             return render_template('upload.html', shows=user_shows, episodes=user_episodes)
@@ -730,6 +1765,8 @@ def upload():
     if not allowed_file(mp3_file.filename) and not editing_id:
         return render_template('upload.html', shows=user_shows, error='Invalid MP3 file', episodes=user_episodes)
     
+    id = editing_id or ''.join(random.choices(string.ascii_letters + string.digits, k=16))
+    
     if mp3_file:
         mp3_filename = secure_filename(mp3_file.filename)
         mp3_path = os.path.join(ARCHIVE_PATH, mp3_filename)
@@ -742,11 +1779,19 @@ def upload():
         except Exception as e:
             logger.error(f"Error extracting MP3 metadata: {e}")
             return render_template('upload.html', shows=user_shows, error='Failed to read MP3 metadata', episodes=user_episodes)
+        
+        loudness, peak = analyze_upload(mp3_path, id)
+        gain = normalize_upload(mp3_path, mp3_filename, loudness, peak)
+        if archive_cache:
+            archive_cache.touch(mp3_filename)
     else:
         mp3_path = archive_dict[editing_id]['filepath']
         mp3_filename = archive_dict[editing_id]['filename']
         duration = archive_dict[editing_id]['duration']
         bitrate = archive_dict[editing_id]['bitrate']
+        loudness = archive_dict[editing_id].get('loudness')
+        peak = archive_dict[editing_id].get('peak')
+        gain = archive_dict[editing_id].get('gain')
     
     if thumbnail_file:
         # Validate and save thumbnail
@@ -763,7 +1808,6 @@ def upload():
     genres_list = [g.strip() for g in genres.split(',')]
     
     # Create archive entry
-    id = editing_id or ''.join(random.choices(string.ascii_letters + string.digits, k=16))
     archive_data = {
         'id': id,
         'title': title,
@@ -777,11 +1821,12 @@ def upload():
         'filename': mp3_filename,
         'date': show_date
     }
-    filename = f"{id}.json"
-    with open(f'data/{filename}', 'w') as f:
-        json.dump(archive_data, f)
-
-    refresh_archive_dict()
+    if loudness is not None:
+        archive_data['loudness'] = loudness
+        archive_data['peak'] = peak
+    if gain is not None:
+        archive_data['gain'] = gain
+    save_new_archive(archive_data)
     user_episodes = get_user_episodes(user_shows)
     
     logger.info(f"New upload: {title} ({duration}s, {bitrate} bps)")
@@ -799,5 +1844,24 @@ def upload():
 # Warm up get_current
 get_current()
 
+archive_cache = ArchiveCache() if ARCHIVE_CACHE_BYTES else None
+if archive_cache and not SCALE_OUT:
+    archive_cache.start()
+
+# Only the process producing audio polls Icecast and warms the relay;
+# scale-out followers read the status it publishes
+live_relay = LiveRelay()
+live_monitor = LiveMonitor(status_path=LIVE_STATUS_PATH if SCALE_OUT else None)
+live_monitor.start()
+
+broadcaster = StreamBroadcaster()
+if SCALE_OUT:
+    catalog_watcher = CatalogWatcher()
+    catalog_watcher.start()
+    ScaleOutCoordinator(broadcaster).start()
+else:
+    live_monitor.relay = live_relay
+    broadcaster.start()
+
 if __name__ == '__main__':
     app.run(debug=True, port=8888, threaded=True)
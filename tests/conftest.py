@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The modules under test live flat in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# upload.py reads bucket credentials at import time
+os.environ.setdefault('AWS_ID', 'testing')
+os.environ.setdefault('AWS_P', 'testing')
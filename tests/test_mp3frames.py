@@ -0,0 +1,172 @@
+import io
+import struct
+
+import pytest
+
+import mp3frames
+
+
+class BitWriter:
+    def __init__(self):
+        self.bits = []
+
+    def write(self, value, count):
+        """Append a field MSB first; returns its bit offset"""
+        offset = len(self.bits)
+        self.bits.extend((value >> (count - 1 - i)) & 1 for i in range(count))
+        return offset
+
+    def to_bytes(self):
+        padded = self.bits + [0] * (-len(self.bits) % 8)
+        return bytes(
+            int(''.join(map(str, padded[i:i + 8])), 2)
+            for i in range(0, len(padded), 8)
+        )
+
+
+def read_bits(data, bit_offset, count):
+    value = 0
+    for i in range(bit_offset, bit_offset + count):
+        value = (value << 1) | ((data[i // 8] >> (7 - i % 8)) & 1)
+    return value
+
+
+def reference_crc16(data, crc=0xFFFF):
+    """Bit-serial CRC-16, polynomial 0x8005, as in ISO 11172-3"""
+    for byte in data:
+        for i in range(7, -1, -1):
+            feedback = ((crc >> 15) ^ (byte >> i)) & 1
+            crc = (crc << 1) & 0xFFFF
+            if feedback:
+                crc ^= 0x8005
+    return crc
+
+
+def side_info(mpeg1, channels, gains):
+    """Side info field by field per ISO 11172-3 / 13818-3; returns (bytes, gain bit offsets)"""
+    writer = BitWriter()
+    if mpeg1:
+        writer.write(0, 9)                              # main_data_begin
+        writer.write(0, 5 if channels == 1 else 3)      # private_bits
+        for _ in range(channels):
+            writer.write(0, 4)                          # scfsi
+        granules = 2
+    else:
+        writer.write(0, 8)
+        writer.write(0, 1 if channels == 1 else 2)
+        granules = 1
+
+    offsets = []
+    gains = iter(gains)
+    for _ in range(granules):
+        for _ in range(channels):
+            writer.write(0x123, 12)                     # part2_3_length
+            writer.write(0x55, 9)                       # big_values
+            offsets.append(writer.write(next(gains), 8))
+            writer.write(0x3, 4 if mpeg1 else 9)        # scalefac_compress
+            writer.write(0, 1)                          # window_switching_flag
+            writer.write(0b101010101010101, 15)         # table_select[3]
+            writer.write(0b1001, 4)                     # region0_count
+            writer.write(0b011, 3)                      # region1_count
+            writer.write(0b111 if mpeg1 else 0b11, 3 if mpeg1 else 2)  # preflag, scalefac_scale, count1table_select
+    return writer.to_bytes(), offsets
+
+
+def make_frame(mpeg1, channels, protected, gains):
+    """One Layer III frame; returns (frame, side info start, gain bit offsets)"""
+    b1 = 0xE0 | ((3 if mpeg1 else 2) << 3) | (1 << 1) | (0 if protected else 1)
+    b2 = (9 << 4) if mpeg1 else (8 << 4)                # 128 kbps @ 44.1 kHz / 64 kbps @ 22.05 kHz
+    b3 = 0xC0 if channels == 1 else 0x00
+    header = bytes([0xFF, b1, b2, b3])
+    length = 417 if mpeg1 else 208
+
+    info, offsets = side_info(mpeg1, channels, gains)
+    crc = struct.pack('>H', reference_crc16(header[2:] + info)) if protected else b''
+    frame = header + crc + info
+    frame += bytes((i * 7) & 0xFF for i in range(length - len(frame)))
+    return frame, len(header) + len(crc), offsets
+
+
+LAYOUTS = [
+    pytest.param(mpeg1, channels, protected, id=f"{'mpeg1' if mpeg1 else 'mpeg2'}-{channels}ch-{'crc' if protected else 'nocrc'}")
+    for mpeg1 in (True, False)
+    for channels in (1, 2)
+    for protected in (False, True)
+]
+
+
+def test_crc16_check_value():
+    assert mp3frames.crc16(b'123456789') == 0xAEE7 == reference_crc16(b'123456789')
+
+
+@pytest.mark.parametrize('mpeg1, channels, protected', LAYOUTS)
+def test_parse_synthetic_frame(mpeg1, channels, protected):
+    frame, _, offsets = make_frame(mpeg1, channels, protected, [100] * 4)
+    header = mp3frames.parse_frame_header(frame)
+    assert header.length == len(frame)
+    assert header.channels == channels
+    assert header.protected == protected
+    assert len(mp3frames.global_gain_offsets(header)) == len(offsets)
+
+
+@pytest.mark.parametrize('mpeg1, channels, protected', LAYOUTS)
+def test_apply_gain_steps(mpeg1, channels, protected):
+    gains = [100, 150, 200, 250]
+    frames = [make_frame(mpeg1, channels, protected, gains) for _ in range(3)]
+    data = bytearray(b''.join(frame for frame, _, _ in frames))
+    original = bytes(data)
+
+    assert mp3frames.apply_gain_steps(data, 4) == 3
+    assert len(data) == len(original)
+
+    position = 0
+    for frame, side_start, offsets in frames:
+        base = (position + side_start) * 8
+        edited = [read_bits(data, base + offset, 8) for offset in offsets]
+        assert edited == [min(gain + 4, 255) for gain in gains[:len(offsets)]]
+
+        # Every other bit outside the CRC is untouched
+        changed_bits = {base + offset + i for offset in offsets for i in range(8)}
+        if protected:
+            changed_bits.update(range((position + 4) * 8, (position + 6) * 8))
+        for bit in range(position * 8, (position + len(frame)) * 8):
+            if bit not in changed_bits:
+                assert read_bits(data, bit, 1) == read_bits(original, bit, 1)
+
+        if protected:
+            side_end = position + side_start + len(side_info(mpeg1, channels, gains)[0])
+            stored = struct.unpack('>H', data[position + 4:position + 6])[0]
+            assert stored == reference_crc16(data[position + 2:position + 4] + data[position + 6:side_end])
+        position += len(frame)
+
+
+def test_apply_gain_steps_clamps():
+    frame, side_start, offsets = make_frame(True, 2, False, [2, 3, 253, 254])
+    data = bytearray(frame)
+    mp3frames.apply_gain_steps(data, -5)
+    assert [read_bits(data, side_start * 8 + offset, 8) for offset in offsets] == [0, 0, 248, 249]
+    mp3frames.apply_gain_steps(data, 10)
+    assert [read_bits(data, side_start * 8 + offset, 8) for offset in offsets] == [10, 10, 255, 255]
+
+
+class PipeReader:
+    """A pipe-like stream: read() only, returning short reads"""
+
+    def __init__(self, data, chunk):
+        self.stream = io.BytesIO(data)
+        self.chunk = chunk
+
+    def read(self, size):
+        return self.stream.read(min(size, self.chunk))
+
+
+@pytest.mark.parametrize('mpeg1, channels, protected', LAYOUTS)
+def test_read_frames_resyncs(mpeg1, channels, protected):
+    frames = [make_frame(mpeg1, channels, protected, [120] * 4)[0] for _ in range(5)]
+    id3 = b'ID3\x04\x00\x00\x00\x00\x00\x05' + b'\xff' * 5
+    junk = b'\x00\xff\xfb\x12junk'
+    data = id3 + frames[0] + frames[1] + junk + b''.join(frames[2:])
+
+    for stream in (io.BufferedReader(io.BytesIO(data)), PipeReader(data, 37)):
+        read = [frame for frame, _ in mp3frames.read_frames(stream, block_size=64)]
+        assert read == frames
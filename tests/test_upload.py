@@ -0,0 +1,60 @@
+import os
+import hashlib
+
+import pytest
+import boto3
+from boto3.s3.transfer import TransferConfig
+
+import upload
+
+MB = 1024 * 1024
+
+
+def s3_etag(data, chunksize):
+    """Multipart ETag as S3 computes it"""
+    digests = [hashlib.md5(data[i:i + chunksize]).digest() for i in range(0, len(data), chunksize)]
+    return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+
+
+@pytest.fixture
+def archive(tmp_path):
+    data = os.urandom(20 * MB)
+    path = tmp_path / 'show.mp3'
+    path.write_bytes(data)
+    return str(path), data
+
+
+def test_single_part_etag(tmp_path):
+    path = tmp_path / 'small.mp3'
+    path.write_bytes(b'abc')
+    assert upload.matches_remote_etag(str(path), 3, hashlib.md5(b'abc').hexdigest())
+    assert not upload.matches_remote_etag(str(path), 3, hashlib.md5(b'abd').hexdigest())
+
+
+@pytest.mark.parametrize('chunksize', [8 * MB, 16 * MB, 5 * MB])
+def test_multipart_etag_any_part_size(archive, chunksize):
+    path, data = archive
+    assert upload.matches_remote_etag(path, len(data), s3_etag(data, chunksize))
+
+
+def test_multipart_etag_detects_changed_content(archive):
+    path, data = archive
+    changed = data[:-1] + bytes([data[-1] ^ 1])
+    assert not upload.matches_remote_etag(path, len(data), s3_etag(changed, 8 * MB))
+
+
+def test_plan_skips_objects_uploaded_with_default_part_size(archive, tmp_path):
+    """Archives uploaded by the web form (boto3 defaults) must not be re-uploaded"""
+    moto = pytest.importorskip('moto')
+    path, data = archive
+
+    with moto.mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=upload.BUCKET)
+        client.upload_file(path, upload.BUCKET, upload.PREFIX + 'show.mp3', Config=TransferConfig())
+
+        remote = upload.get_files_in_bucket(client)
+        assert remote['show.mp3'][1].endswith('-3')
+
+        catalog = {'a': {'filename': 'show.mp3'}}
+        assert upload.plan_uploads(catalog, remote, os.path.dirname(path)) == []
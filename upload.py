@@ -1,136 +1,272 @@
 import os
-import time
 import json
 import boto3
-import random
+import hashlib
+import argparse
 import requests
-import tempfile
-import itertools
-import subprocess
-import urllib.parse
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor
-import threading
-import subprocess
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 import logging
+import schedule
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-with open('archives.json', 'r') as f: 
-    archive_dict = json.load(f)
-    keys_to_del = []
-    for key, val in archive_dict.items():
-        if ('Cuts In The Fog' in val['title']) & (key[0] != 'c'):
-            keys_to_del.append(key)
-
-    for i in keys_to_del:
-        del archive_dict[i]
-
-def upload_to_bucket(id):    
-    session = boto3.session.Session()
-    client = session.client('s3',
-                          region_name='sfo3',
-                          endpoint_url='https://sfo3.digitaloceanspaces.com',
-                          aws_access_key_id='DO00PTMRLEA3CJ6KGGQJ',
-                          aws_secret_access_key='F5nqO8l6nhOBfmcJDjjEuznff0cTaMOJVINyuMsb6M0')
-    
-    file_path = f'archives/{id}.mp3'
-    object_key = f'monotonic-radio/{id}.mp3'
-    
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+BUCKET = 'scudbucket'
+PREFIX = 'monotonic-radio/'
+ENDPOINT_URL = 'https://sfo3.digitaloceanspaces.com'
+REGION = 'sfo3'
+ARCHIVE_PATH = '/var/lib/mtr/archives'
+THUMBNAIL_DIR = 'assets/thumbnails'
+
+FILE_CONCURRENCY = 4            # archives uploaded at once
+PART_CONCURRENCY = 4            # parts in flight per multipart upload
+THUMBNAIL_CONCURRENCY = 8
+MULTIPART_THRESHOLD = 16 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 16 * 1024 * 1024
+# Part sizes tried when checking a multipart ETag: ours, and boto3's default
+# 8 MB used by the web upload in stream.py and older versions of this tool
+KNOWN_CHUNKSIZES = (MULTIPART_CHUNKSIZE, 8 * 1024 * 1024)
+HTTP_TIMEOUT = 30
+
+PLAYLIST_DAYS = 7
+
+try:
+    with open('config.json', 'r') as f:
+        config = json.load(f)
+except:
+    config = {
+        'AWS_ID':os.environ['AWS_ID'],
+        'AWS_P':os.environ['AWS_P']
+    }
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_THRESHOLD,
+    multipart_chunksize=MULTIPART_CHUNKSIZE,
+    max_concurrency=PART_CONCURRENCY,
+    use_threads=True
+)
+
+# ============================================================================
+# BUCKET
+# ============================================================================
+
+def make_client(endpoint_url=ENDPOINT_URL):
+    """One pooled, thread-safe S3 client shared by every transfer"""
+    return boto3.client('s3',
+                        region_name=REGION,
+                        endpoint_url=endpoint_url,
+                        aws_access_key_id=config['AWS_ID'],
+                        aws_secret_access_key=config['AWS_P'],
+                        config=Config(
+                            max_pool_connections=FILE_CONCURRENCY * PART_CONCURRENCY,
+                            retries={'max_attempts': 5, 'mode': 'standard'}
+                        ))
+
+
+def get_files_in_bucket(client, bucket=BUCKET):
+    """Every object under PREFIX as {filename: (size, etag)}, across all result pages"""
+    files = {}
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=PREFIX):
+        for obj in page.get('Contents', []):
+            filename = obj['Key'][len(PREFIX):]
+            files[filename] = (obj['Size'], obj['ETag'].strip('"'))
+    return files
+
+
+def local_etag(path, chunksize=None):
+    """The ETag S3 reports for this file uploaded in one piece, or in `chunksize` parts"""
+    with open(path, 'rb') as f:
+        if chunksize is None:
+            return hashlib.md5(f.read()).hexdigest()
+
+        part_digests = []
+        while block := f.read(chunksize):
+            part_digests.append(hashlib.md5(block).digest())
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+
+def matches_remote_etag(path, size, etag):
+    """Whether the local file has the content behind a remote ETag.
+
+    Multipart ETags depend on the part size of whoever uploaded the
+    object, so the candidates are the known part sizes plus the whole-MB
+    size implied by the ETag's part count.
+    """
+    if '-' not in etag:
+        return local_etag(path) == etag
+
+    parts = int(etag.rsplit('-', 1)[1])
+    implied = -(-size // parts)
+    implied = -(-implied // (1024 * 1024)) * 1024 * 1024
+    for chunksize in dict.fromkeys(KNOWN_CHUNKSIZES + (implied,)):
+        if -(-size // chunksize) == parts and local_etag(path, chunksize) == etag:
+            return True
+    return False
+
+
+def plan_uploads(catalog, remote, archive_path):
+    """Diff local archives against the bucket; returns [(filename, path, size, reason)]"""
+    plan = []
+    for archive in catalog.values():
+        filename = archive['filename']
+        path = os.path.join(archive_path, filename)
+        if not os.path.exists(path):
+            logger.warning(f"Skipping {filename}: not found in {archive_path}")
+            continue
+
+        size = os.path.getsize(path)
+        if filename not in remote:
+            plan.append((filename, path, size, 'missing'))
+        elif remote[filename][0] != size:
+            plan.append((filename, path, size, 'size changed'))
+        elif not matches_remote_etag(path, size, remote[filename][1]):
+            plan.append((filename, path, size, 'content changed'))
+    return plan
+
+
+def upload_to_bucket(client, path, filename, bucket=BUCKET):
+    """Upload one archive; large files go up as parallel multipart parts"""
+    object_key = f'{PREFIX}{filename}'
     try:
-        client.upload_file(file_path, 'scudbucket', object_key,
-                          ExtraArgs={'StorageClass': 'STANDARD','ACL':'public-read'})
-        print(f"Successfully uploaded {object_key}")
+        client.upload_file(path, bucket, object_key,
+                           ExtraArgs={'StorageClass': 'STANDARD', 'ACL': 'public-read'},
+                           Config=TRANSFER_CONFIG)
+        logger.info(f"Successfully uploaded {object_key}")
         return True
     except Exception as e:
-        print(f"Error uploading: {e}")
+        logger.error(f"Error uploading {object_key}: {e}")
         return False
-    
-def get_files_in_bucket():
-    client = boto3.client('s3',
-                         region_name='sfo3',
-                         endpoint_url='https://sfo3.digitaloceanspaces.com',
-                         aws_access_key_id='DO00PTMRLEA3CJ6KGGQJ',
-                         aws_secret_access_key='F5nqO8l6nhOBfmcJDjjEuznff0cTaMOJVINyuMsb6M0')
-    
-    files = []
-    response = client.list_objects_v2(Bucket='scudbucket', Prefix='monotonic-radio/')
-    
-    if 'Contents' in response:
-        for obj in response['Contents']:
-            if obj['Key'].endswith('.mp3'):
-                files.append(obj['Key'].replace('monotonic-radio/','').replace('.mp3',''))
-    
-    return files
 
-def download_thumbnail(archive):
-    if 'https://' in archive['thumbnail']:
-        filename = 'assets/thumbnails/' + archive['id'] + '.webp'
-        if not os.path.exists(filename):
-            resp = requests.get(archive['thumbnail'])
-            if resp.status_code == 200:
-                with open(filename, 'wb') as file:
-                    file.write(resp.content)
-                print(f"Image downloaded successfully as {filename}!")
-            else:
-                print(f"Failed to download image for {archive['id']}, {resp.status_code}")
-
-
-def get_mp3_bitrate_and_duration(filepath):
-    cmd = [
-        'ffprobe', '-v', 'quiet', '-print_format', 'json',
-        '-show_streams', filepath
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    data = json.loads(result.stdout)
+# ============================================================================
+# THUMBNAILS
+# ============================================================================
+
+def plan_thumbnails(catalog):
+    """Remote thumbnails that have no local copy yet: [(archive_id, url, path)]"""
+    plan = []
+    for archive in catalog.values():
+        if archive['thumbnail'].startswith('https://'):
+            path = os.path.join(THUMBNAIL_DIR, archive['id'] + '.webp')
+            if not os.path.exists(path):
+                plan.append((archive['id'], archive['thumbnail'], path))
+    return plan
+
+
+def download_thumbnail(session, archive_id, url, path):
     try:
-        bitrate = float(data['streams'][0]['bit_rate'])
-    except:
-        bitrate = float(data['streams'][0]['sample_rate'])
-    duration = float(data['streams'][0]['duration'])
-    return bitrate, duration
-
-total_duration = 0
-for key, val in archive_dict.items():
-    print(key)
-    bitrate, duration = get_mp3_bitrate_and_duration(f'archives/{key}.mp3')
-    archive_dict[key]['bitrate'] = bitrate
-    archive_dict[key]['duration'] = duration
-    total_duration += duration
-
-def make_playlist(archives, iterations):
-    playlist = []
-    for i in range(iterations):
-        for j in archives:
-            
-            shuffled_archives = archives.copy()
-            random.Random(i).shuffle(shuffled_archives)
-            
-            if len(playlist) > 0:
-                attempt = 0
-                while shuffled_archives[0] == playlist[-1] and attempt < 100:
-                    random.Random(iterations + attempt + 1).shuffle(shuffled_archives)
-                    attempt += 1
-
-            playlist.extend(shuffled_archives)
-    
-    print((total_duration / 60 / 60) * iterations)
-    return playlist
-
-playlist = make_playlist(list(archive_dict.keys()), 5)
-
-def upload():
-    files = get_files_in_bucket()
-    for key, val in archive_dict.items():
-        download_thumbnail(val)
-        if key not in files:
-            upload_to_bucket(key)
-
-with open('playlist.json', 'w') as f:
-    json.dump(playlist, f)
-
-with open('archives.json', 'w') as f:
-    json.dump(archive_dict, f)
-
-upload()
\ No newline at end of file
+        resp = session.get(url, timeout=HTTP_TIMEOUT)
+    except requests.RequestException as e:
+        logger.error(f"Failed to download image for {archive_id}: {e}")
+        return False
+
+    if resp.status_code != 200:
+        logger.error(f"Failed to download image for {archive_id}, {resp.status_code}")
+        return False
+
+    with open(path, 'wb') as file:
+        file.write(resp.content)
+    logger.info(f"Image downloaded successfully as {path}")
+    return True
+
+# ============================================================================
+# PROGRAM GUIDE
+# ============================================================================
+
+def make_playlist(catalog, start, end):
+    """Lazily yield the broadcast schedule between start and end, one track at a time"""
+    archives, total_duration = schedule.catalog_order(catalog)
+    for track_start, track_end, archive_id in schedule.iter_schedule(archives, catalog, total_duration, start, end):
+        yield {
+            'id': archive_id,
+            'title': catalog[archive_id]['title'],
+            'start': track_start.isoformat(),
+            'end': track_end.isoformat(),
+            'start_ts': track_start.timestamp(),
+            'end_ts': track_end.timestamp()
+        }
+
+def write_playlist(path, entries):
+    """Stream schedule entries out as a JSON array without holding them in memory"""
+    count = 0
+    with open(path, 'w') as f:
+        f.write('[')
+        for entry in entries:
+            if count:
+                f.write(',\n')
+            json.dump(entry, f)
+            count += 1
+        f.write(']\n')
+    return count
+
+# ============================================================================
+# RECONCILE
+# ============================================================================
+
+def run_parallel(jobs, workers):
+    """Run (fn, *args) jobs on a bounded pool; returns the number that succeeded"""
+    succeeded = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(fn, *args) for fn, *args in jobs]
+        for future in as_completed(futures):
+            if future.result():
+                succeeded += 1
+    return succeeded
+
+
+def upload(catalog, archive_path, endpoint_url=ENDPOINT_URL, bucket=BUCKET, dry_run=False):
+    """Bring the bucket and local thumbnails in line with the catalog"""
+    client = make_client(endpoint_url)
+    remote = get_files_in_bucket(client, bucket)
+    logger.info(f"{len(remote)} objects in {bucket}/{PREFIX}")
+
+    uploads = plan_uploads(catalog, remote, archive_path)
+    thumbnails = plan_thumbnails(catalog)
+
+    total_bytes = sum(size for _, _, size, _ in uploads)
+    logger.info(f"Plan: upload {len(uploads)} archives ({total_bytes / 1e6:.1f} MB), fetch {len(thumbnails)} thumbnails")
+    for filename, _, size, reason in uploads:
+        logger.info(f"   upload {filename} ({size / 1e6:.1f} MB): {reason}")
+    for archive_id, url, _ in thumbnails:
+        logger.info(f"   thumbnail {archive_id}: {url}")
+
+    if dry_run:
+        return
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=THUMBNAIL_CONCURRENCY)
+    session.mount('https://', adapter)
+    fetched = run_parallel([(download_thumbnail, session, *job) for job in thumbnails], THUMBNAIL_CONCURRENCY)
+
+    uploaded = run_parallel([(upload_to_bucket, client, path, filename, bucket)
+                             for filename, path, _, _ in uploads], FILE_CONCURRENCY)
+
+    logger.info(f"Uploaded {uploaded}/{len(uploads)} archives, fetched {fetched}/{len(thumbnails)} thumbnails")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sync archives to the bucket and export the program guide')
+    parser.add_argument('--archive-path', default=ARCHIVE_PATH)
+    parser.add_argument('--endpoint-url', default=ENDPOINT_URL, help='S3 endpoint, e.g. a local stand-in for testing')
+    parser.add_argument('--bucket', default=BUCKET)
+    parser.add_argument('--dry-run', action='store_true', help='report the plan without transferring anything')
+    parser.add_argument('--days', type=int, default=PLAYLIST_DAYS, help='length of the exported program guide')
+    args = parser.parse_args()
+
+    # Use the live server's catalog so the bucket and guide match the stream
+    catalog = schedule.load_catalog('data')
+
+    playlist_start = datetime.now()
+    playlist_end = playlist_start + timedelta(days=args.days)
+    if not args.dry_run:
+        count = write_playlist('playlist.json', make_playlist(catalog, playlist_start, playlist_end))
+        logger.info(f"Wrote {count} tracks from {playlist_start} to {playlist_end}")
+
+    upload(catalog, args.archive_path, args.endpoint_url, args.bucket, args.dry_run)